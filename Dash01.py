@@ -11,10 +11,13 @@ path_options = [
     '/Users/simon/Library/CloudStorage/Dropbox/KBB MF/AAA/Balancetes/Fechamentos/data/clean/merged_data.xlsx'
 ]
 
+# Only the product code and the two plotted values are used, so skip parsing the other columns
+dash_usecols = ['CODPP', 'VLRTOTALPSKU', 'MARGVLR']
+
 # Find the correct path
 for path in path_options:
     try:
-        df = pd.read_excel(path, sheet_name='MLK_Vendas')
+        df = pd.read_excel(path, sheet_name='MLK_Vendas', usecols=dash_usecols)
         break
     except FileNotFoundError:
         df = None
@@ -46,6 +49,29 @@ app.layout = html.Div([
     html.Div(id='page-number')
 ])
 
+# Sales and margin per product, sorted by sales; the data does not change while the app runs,
+# so this is built on the first callback and reused by every page
+sorted_products = None
+
+def get_sorted_products():
+    global sorted_products
+    if sorted_products is None:
+        # Exclude datetime columns for the sum operation
+        numeric_columns = [col for col in df.select_dtypes(include=[np.number]).columns if col != 'CODPP']
+
+        # Group data by product: factorize the codes once (sorted, like groupby's keys) and sum each
+        # column with bincount; rows without a CODPP are left out and missing values count as 0, as in groupby
+        codes, products = pd.factorize(df['CODPP'], sort=True)
+        has_code = codes >= 0
+        grouped_df = pd.DataFrame({'CODPP': products})
+        for col in numeric_columns:
+            weights = np.nan_to_num(df[col].to_numpy(dtype=float)[has_code])
+            grouped_df[col] = np.bincount(codes[has_code], weights=weights, minlength=len(products))
+
+        # Sort by total sales
+        sorted_products = grouped_df.sort_values(by='VLRTOTALPSKU', ascending=False)
+    return sorted_products
+
 @app.callback(
     Output('sales-by-product', 'figure'),
     Output('margin-by-product', 'figure'),
@@ -56,14 +82,7 @@ app.layout = html.Div([
 )
 def update_graphs(page):
     try:
-        # Exclude datetime columns for the sum operation
-        numeric_df = df.select_dtypes(include=[np.number])
-
-        # Group data by product and calculate sales and margin
-        grouped_df = df.groupby('CODPP')[numeric_df.columns].sum().reset_index()
-        
-        # Sort by total sales
-        sorted_df = grouped_df.sort_values(by='VLRTOTALPSKU', ascending=False)
+        sorted_df = get_sorted_products()
         
         # Number of products per page
         products_per_page = 10
@@ -74,11 +93,6 @@ def update_graphs(page):
         end_index = start_index + products_per_page
         paginated_df = sorted_df.iloc[start_index:end_index]
 
-        # Debug print statements
-        print(f"Total pages: {total_pages}")
-        print(f"Paginated dataframe for page {page}:")
-        print(paginated_df.head())
-
         if paginated_df.empty:
             print("Paginated dataframe is empty.")
             return {}, {}, total_pages, {i: str(i) for i in range(1, total_pages + 1)}, f"Page {page} of {total_pages}"
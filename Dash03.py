@@ -23,10 +23,20 @@ else:
 
 print("Base directory set to:", base_dir)
 
+# Columns used by the dashboard; every other column of each sheet is skipped at read time
+dash_usecols = ['ANOMES', 'CODPP', 'VLRTOTALPSKU', 'MARGVLR', 'QTD', 'STATUS PEDIDO', 'CATEGORIA', 'SUBCATEGORIA', 'FRETEVLR']
+dash_category_cols = ['STATUS PEDIDO', 'CATEGORIA', 'SUBCATEGORIA']
+
 # Load your processed data
 if base_dir:
     data_file = os.path.join(base_dir, 'clean/merged_data.xlsx')
-    data = pd.read_excel(data_file, sheet_name=None)
+    data = pd.read_excel(data_file, sheet_name=None, usecols=lambda col: col in dash_usecols)
+    # The label columns repeat a handful of values, so keep them as categoricals (one code per row)
+    # instead of one Python string object per row
+    for df in data.values():
+        for col in dash_category_cols:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
     print("Sheets loaded:", data.keys())
 else:
     print("Data file not found. Please check the directories.")
@@ -79,6 +89,10 @@ app.layout = html.Div([
     html.Div(id='additional-graphs')
 ])
 
+# Dashboard outputs per sheet: the loaded data does not change while the app runs, so the metrics
+# and figures of a sheet are built the first time it is selected and reused afterwards
+sheet_outputs = {}
+
 # Define callback to update table based on selected sheet
 @app.callback(
     Output('total-sales', 'children'),
@@ -98,6 +112,8 @@ app.layout = html.Div([
     Input('sheet-dropdown', 'value')
 )
 def update_dashboard(selected_sheet):
+    if selected_sheet in sheet_outputs:
+        return sheet_outputs[selected_sheet]
     df = data[selected_sheet]
 
     # Calculate metrics
@@ -145,7 +161,7 @@ def update_dashboard(selected_sheet):
             margin_fig = px.bar(df, x='CODPP', y='MARGVLR', title='Margin per CODPP')
             additional_graphs.append(dcc.Graph(figure=margin_fig))
 
-    return (
+    sheet_outputs[selected_sheet] = (
         f"Sales: {total_sales}",
         f"Profit: {total_profit}",
         f"Profit to Sales Ratio: {profit_to_sales_ratio:.2f}%",
@@ -161,6 +177,7 @@ def update_dashboard(selected_sheet):
         top_products_fig,
         additional_graphs
     )
+    return sheet_outputs[selected_sheet]
 
 # Run the app
 if __name__ == '__main__':
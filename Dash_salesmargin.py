@@ -2,8 +2,18 @@
 from dash import html, dcc, Input, Output
 import plotly.express as px
 import pandas as pd
+import numpy as np
 from Dash_shared import load_data, app
 
+# CODPP of the loaded MLK_Vendas factorized once (sorted, like groupby's keys) and reused by every callback
+product_codes = None
+
+def get_product_codes(df):
+    global product_codes
+    if product_codes is None or product_codes[0] is not df:
+        codes, products = pd.factorize(df['CODPP'], sort=True)
+        product_codes = (df, codes, products)
+    return product_codes[1], product_codes[2]
 
 
 # Define the layout for the sales and margin view
@@ -59,32 +69,39 @@ salesmargin_layout = html.Div([
 )
 def update_sales_margin_graph(start_date, end_date, company, marketplace, page):
     df = load_data()['MLK_Vendas']  # Adjust the key as needed
+    codes, products = get_product_codes(df)
+
+    # Rows without a CODPP are left out, as groupby does
+    mask = codes >= 0
 
     # Filter by date range
     if start_date and end_date:
-        mask = (df['DATA DA VENDA'] >= start_date) & (df['DATA DA VENDA'] <= end_date)
-        df = df.loc[mask]
+        mask &= ((df['DATA DA VENDA'] >= start_date) & (df['DATA DA VENDA'] <= end_date)).to_numpy()
 
     # Filter by company
     if company:
-        df = df[df['EMPRESA'] == company]
+        mask &= (df['EMPRESA'] == company).to_numpy()
 
     # Filter by marketplace
     if marketplace:
-        df = df[df['MP'] == marketplace]
+        mask &= (df['MP'] == marketplace).to_numpy()
 
-    # Group and paginate
-    grouped_df = df.groupby('CODPP').agg({
-        'VLRTOTALPSKU': 'sum',
-        'MARGVLR': 'sum'
-    }).reset_index()
-    grouped_df = grouped_df.sort_values(by='VLRTOTALPSKU', ascending=False)
-    grouped_df['MARGPCT'] = (grouped_df['MARGVLR'] / grouped_df['VLRTOTALPSKU']) * 100
+    # Group and paginate: sum per product code with bincount over the cached codes (missing values count as 0)
+    selected = codes[mask]
+    grouped_df = pd.DataFrame({
+        'CODPP': products,
+        'VLRTOTALPSKU': np.bincount(selected, weights=np.nan_to_num(df['VLRTOTALPSKU'].to_numpy(dtype=float)[mask]), minlength=len(products)),
+        'MARGVLR': np.bincount(selected, weights=np.nan_to_num(df['MARGVLR'].to_numpy(dtype=float)[mask]), minlength=len(products))
+    })
+    grouped_df = grouped_df[np.bincount(selected, minlength=len(products)) > 0].reset_index(drop=True)
 
     page_size = 10
     start_idx = (page - 1) * page_size
     end_idx = start_idx + page_size
-    paginated_df = grouped_df.iloc[start_idx:end_idx]
+    # Only the products up to the end of the page need ordering: take the top end_idx by sales
+    # (partial selection, in descending order) instead of sorting every product
+    paginated_df = grouped_df.nlargest(end_idx, 'VLRTOTALPSKU').iloc[start_idx:end_idx].copy()
+    paginated_df['MARGPCT'] = (paginated_df['MARGVLR'] / paginated_df['VLRTOTALPSKU']) * 100
 
     fig = px.bar(paginated_df, x='VLRTOTALPSKU', y='CODPP', orientation='h',
                  hover_data={'MARGVLR': True, 'MARGPCT': ':.2f'},
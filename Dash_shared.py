@@ -1,34 +1,39 @@
 # shared.py
 import os
-import pandas as pd
 from dash import Dash
+from excel_cache import read_excel_cached
 
 app = Dash(__name__, suppress_callback_exceptions=True)
 
 # Global variable to store loaded data
 loaded_data = None
 
+# Resolve the data file once at import, like the other scripts' base_dir
+path_options = [
+    '/Users/mauricioalouan/Dropbox/KBB MF/AAA/Balancetes/Fechamentos/data/clean/merged_data.xlsx',
+    '/Users/simon/Library/CloudStorage/Dropbox/KBB MF/AAA/Balancetes/Fechamentos/data/clean/merged_data.xlsx'
+]
+for path in path_options:
+    if os.path.exists(path):
+        data_path = path
+        break
+else:
+    data_path = None
+
 # Function to load data
 def load_data():
     global loaded_data
     if loaded_data is not None:
         return loaded_data
 
-    path_options = [
-        '/Users/mauricioalouan/Dropbox/KBB MF/AAA/Balancetes/Fechamentos/data/clean/merged_data.xlsx',
-        '/Users/simon/Library/CloudStorage/Dropbox/KBB MF/AAA/Balancetes/Fechamentos/data/clean/merged_data.xlsx'
-    ]
-    for path in path_options:
-        if os.path.exists(path):
-            data_path = path
-            break
-    else:
+    if data_path is None:
         print("None of the specified directories exist.")
         return None
 
     # Read all sheets from the Excel file into a dictionary of dataframes
+    # (through the shared pickle cache, so an unchanged workbook is not parsed again)
     try:
-        loaded_data = pd.read_excel(data_path, sheet_name=None)
+        loaded_data = read_excel_cached(data_path, sheet_name=None)
         print(f"Loaded data from {data_path}")
         print("Sheet names:", list(loaded_data.keys()))
         return loaded_data
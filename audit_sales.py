@@ -1,6 +1,18 @@
 import pandas as pd
 import os
 
+# Columns of O_NFCI used by the audit; anything else is skipped at read time
+audit_usecols = [
+    'Cliente (Nome Fantasia)',
+    'Código do Produto',
+    'Quantidade',
+    'Preco Calc',
+    'Total de Mercadoria',
+    'Valor do ICMS ST',
+    'Valor do IPI',
+    'Data de Emissão (completa)'
+]
+
 def read_monthly_data(base_dir, client_name):
     # List of months you have data for
     months = ['2024_01', '2024_02', '2024_03', '2024_04', '2024_05', '2024_06']
@@ -12,9 +24,9 @@ def read_monthly_data(base_dir, client_name):
     for month in months:
         file_path = os.path.join(base_dir, month, f'O_NFCI_{month}_clean.xlsx')
         if os.path.exists(file_path):
-            df = pd.read_excel(file_path)
+            df = pd.read_excel(file_path, usecols=audit_usecols)
             # Filter the data for the specific client
-            client_data = df[df['Cliente (Nome Fantasia)'] == client_name]
+            client_data = df.loc[df['Cliente (Nome Fantasia)'] == client_name]
             all_data.append(client_data)
         else:
             print(f"File {file_path} does not exist.")
@@ -0,0 +1 @@
+# Lets pytest import the top-level scripts (process_data, ...) from the tests folder
@@ -0,0 +1,30 @@
+# excel_cache.py
+import glob
+import hashlib
+import os
+import pandas as pd
+
+# Read an xlsx with pd.read_excel, reusing a pickle copy kept in a .cache folder next to the xlsx.
+# A copy is keyed by the read options and by the xlsx's mtime and size, so it is only reused for the same
+# read of an unchanged file; older copies of that read are removed when a new one is written
+def read_excel_cached(file_path, **read_kwargs):
+    stat = os.stat(file_path)
+    file_dir, filename = os.path.split(file_path)
+    name = os.path.splitext(filename)[0]
+    options = hashlib.md5(repr(sorted(read_kwargs.items())).encode()).hexdigest()[:8]
+    cache_dir = os.path.join(file_dir, '.cache')
+    cache_path = os.path.join(cache_dir, f"{name}-{options}-{stat.st_mtime_ns}-{stat.st_size}.pkl")
+    if os.path.exists(cache_path):
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception as e:
+            print(f"Error reading cache {cache_path}, falling back to the Excel file: {e}")
+    data = pd.read_excel(file_path, **read_kwargs)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for old_cache in glob.glob(os.path.join(cache_dir, f"{glob.escape(name)}-{options}-*.pkl")):
+            os.remove(old_cache)
+        pd.to_pickle(data, cache_path)
+    except OSError as e:
+        print(f"Could not write cache {cache_path}: {e}")
+    return data
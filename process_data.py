@@ -6,7 +6,13 @@ To re-process, delete file from CLEAN Folder.
 
 import re
 import os
+from datetime import date, datetime
+import posixpath
+import zipfile
+from xml.etree import ElementTree
 import openpyxl
+import xlsxwriter
+from openpyxl.utils import range_boundaries
 import pandas as pd
 import numpy as np
 
@@ -27,10 +33,12 @@ else:
 
 print("Base directory set to:", base_dir)
 
-def find_header_row(filepath, header_name):
-    """Utility function to find the header row index using pandas."""
-    for i, row in pd.read_excel(filepath, header=None).iterrows():
-        if header_name in row.values:
+def find_header_row(workbook, header_name):
+    """Utility function to find the header row index by streaming rows of a read-only openpyxl workbook."""
+    # pd.read_excel reads the first sheet, so scan that one and stop at the header
+    ws = workbook.worksheets[0]
+    for i, row in enumerate(ws.iter_rows(values_only=True)):
+        if header_name in row:
             return i
     raise ValueError(f"Header {header_name} not found in the file.")
 
@@ -92,7 +100,7 @@ def process_L_LPI(data):
                         'Frete Seller']  # Update if more columns are involved
     for col in currency_columns:
         if col in data.columns:
-            data[col] = data[col].apply(convert_currency_to_float)
+            data[col] = convert_currency_to_float(data[col])
     return data
 
 def process_MLK_Vendas(data):
@@ -126,23 +134,22 @@ def propagate_package_info(df):
     # Define the columns to propagate
     columns_to_propagate = [
         'Mês de faturamento das suas tarifas', 'NF-e em anexo', 'Dados pessoais ou da empresa', 'Tipo e número do documento',
-        'Endereço', 'Comprador', 'CPF', 'Endereço', 'Cidade', 'Status', 'CEP', 'País',
+        'Endereço', 'Comprador', 'CPF', 'Cidade', 'Status', 'CEP', 'País',
         'Forma de entrega', 'Data a caminho', 'Data de entrega', 'Motorista', 'Número de rastreamento'
     ]
+    order_col = 'N.º de venda_hyperlink'
 
-    # Identify package rows (rows where SKU is NaN)
-    package_rows = df[df['SKU'].isna()]
+    # Identify package rows (rows where SKU is NaN); the last package row of an order wins
+    package_rows = df.loc[df['SKU'].isna() & df[order_col].notna(), [order_col] + columns_to_propagate]
+    package_rows = package_rows.drop_duplicates(subset=order_col, keep='last').set_index(order_col)
 
-    for idx, package_row in package_rows.iterrows():
-        # Get the order ID
-        order_id = package_row['N.º de venda_hyperlink']
-        
-        # Get the SKU rows for this package
-        sku_rows = df[(df['N.º de venda_hyperlink'] == order_id) & df['SKU'].notna()]
-        
+    # Get the SKU rows that belong to a package and copy the package values onto them in one pass
+    sku_mask = df['SKU'].notna() & df[order_col].isin(package_rows.index)
+    if sku_mask.any():
+        package_values = package_rows.reindex(df.loc[sku_mask, order_col])
         for col in columns_to_propagate:
-            df.loc[sku_rows.index, col] = package_row[col]
-    
+            df.loc[sku_mask, col] = package_values[col].to_numpy()
+
     return df
 
 def process_ml_data(df):
@@ -162,44 +169,60 @@ def process_ml_data(df):
 
     # Convert to numeric, coerce errors to NaN, and then fill NaN with 0
     print ('Convert to numeric')
-    df['Quantidade'] = pd.to_numeric(df['Quantidade'], errors='coerce').fillna(0)
-    df['Preço unitário de venda do anúncio (BRL)'] = pd.to_numeric(df['Preço unitário de venda do anúncio (BRL)'], errors='coerce').fillna(0)
-    df['Receita por envio (BRL)'] = pd.to_numeric(df['Receita por envio (BRL)'], errors='coerce').fillna(0)
-    df['Tarifa de venda e impostos'] = pd.to_numeric(df['Tarifa de venda e impostos'], errors='coerce').fillna(0)
-    df['Tarifas de envio'] = pd.to_numeric(df['Tarifas de envio'], errors='coerce').fillna(0)
-    df['Cancelamentos e reembolsos (BRL)'] = pd.to_numeric(df['Cancelamentos e reembolsos (BRL)'], errors='coerce').fillna(0)
-    df['Total (BRL)'] = pd.to_numeric(df['Total (BRL)'], errors='coerce').fillna(0)
+    numeric_cols = ['Quantidade', 'Preço unitário de venda do anúncio (BRL)', 'Receita por envio (BRL)', 'Tarifa de venda e impostos',
+                    'Tarifas de envio', 'Cancelamentos e reembolsos (BRL)', 'Total (BRL)']
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
+
+    # Hash the order key once and group both per-order steps below on its integer codes
+    # (rows without an order get NaN, so groupby drops them just as it did with the string key)
+    order_codes, _ = pd.factorize(df['N.º de venda_hyperlink'])
+    order_key = pd.Series(np.where(order_codes >= 0, order_codes, np.nan), index=df.index)
 
     # Step 1: Calculate the number of unique SKUs per order (excluding NaN SKUs)
     # Adjust the SKUs in Order count if it's greater than 1
-    df['QtdSKUsPac'] = df[df['SKU'].notna()].groupby('N.º de venda_hyperlink')['SKU'].transform('nunique')
-    df['QtdSKUsPac'] = df['QtdSKUsPac'].apply(lambda x: x-1 if x > 1 else x)
+    # (only the SKU rows are counted and adjusted; package rows are left NaN by index alignment)
+    sku_rows = df['SKU'].notna()
+    qtd_skus = df[sku_rows].groupby(order_key[sku_rows])['SKU'].transform('nunique')
+    df['QtdSKUsPac'] = qtd_skus.mask(qtd_skus > 1, qtd_skus - 1)
 
     # Step 2: Calculate the total number of items per order
-    df['QtdItensPac'] = df.groupby('N.º de venda_hyperlink')['Quantidade'].transform('sum')
+    df['QtdItensPac'] = df.groupby(order_key)['Quantidade'].transform('sum')
 
     # Calculate VlrTotalpSKU
     df['VlrTotalpSKU'] = df['Preço unitário de venda do anúncio (BRL)'] * df['Quantidade']
 
-    # Calculate VlrTotalpPac
+    # Calculate the package totals per order in a single groupby pass, then add them one column at a time
+    # so each keeps its own dtype and the columns keep their order
     print ('Calcula totais')
     #print(df['ReceitaEnvioTotPac'].head())
-    df['VlrTotalpPac'] = df.groupby('N.º de venda_hyperlink')['VlrTotalpSKU'].transform('sum')
-    df['ReceitaEnvioTotPac'] = df.groupby('N.º de venda_hyperlink')['Receita por envio (BRL)'].transform('sum')
-    df['TarifaVendaTotPac'] = df.groupby('N.º de venda_hyperlink')['Tarifa de venda e impostos'].transform('sum')
-    df['TarifaEnvioTotPac'] = df.groupby('N.º de venda_hyperlink')['Tarifas de envio'].transform('sum')
-    df['CancelamentosTotPac'] = df.groupby('N.º de venda_hyperlink')['Cancelamentos e reembolsos (BRL)'].transform('sum')
-    df['RepasseTotPac'] = df.groupby('N.º de venda_hyperlink')['Total (BRL)'].transform('sum')
+    pac_totals = {
+        'VlrTotalpSKU': 'VlrTotalpPac',
+        'Receita por envio (BRL)': 'ReceitaEnvioTotPac',
+        'Tarifa de venda e impostos': 'TarifaVendaTotPac',
+        'Tarifas de envio': 'TarifaEnvioTotPac',
+        'Cancelamentos e reembolsos (BRL)': 'CancelamentosTotPac',
+        'Total (BRL)': 'RepasseTotPac',
+    }
+    sums = df.groupby(order_key)[list(pac_totals)].transform('sum')
+    for src, dst in pac_totals.items():
+        df[dst] = sums[src]
 
     # Calculate proportional values
     print ('Calcula Valores Proporcionais')
     #print(df['ReceitaEnvioTotPac'].head())
 
-    df['ReceitaEnvio'] = df['ReceitaEnvioTotPac'] * (df['VlrTotalpSKU'] / df['VlrTotalpPac'])
-    df['TarifaVenda'] = df['TarifaVendaTotPac'] * (df['VlrTotalpSKU'] / df['VlrTotalpPac'])
-    df['TarifaEnvio'] = df['TarifaEnvioTotPac'] * (df['VlrTotalpSKU'] / df['VlrTotalpPac'])
-    df['Cancelamentos'] = df['CancelamentosTotPac'] * (df['VlrTotalpSKU'] / df['VlrTotalpPac'])
-    df['Repasse'] = df['RepasseTotPac'] * (df['VlrTotalpSKU'] / df['VlrTotalpPac'])
+    # Share of the package value that belongs to each SKU row, divided once for all five columns
+    # (an empty package still gives NaN/inf, as each division did before); the five package totals are
+    # then scaled together in one array multiply and written back in one assignment
+    sku_share = (df['VlrTotalpSKU'] / df['VlrTotalpPac']).to_numpy()
+    proportional = {
+        'ReceitaEnvioTotPac': 'ReceitaEnvio',
+        'TarifaVendaTotPac': 'TarifaVenda',
+        'TarifaEnvioTotPac': 'TarifaEnvio',
+        'CancelamentosTotPac': 'Cancelamentos',
+        'RepasseTotPac': 'Repasse',
+    }
+    df[list(proportional.values())] = df[list(proportional)].to_numpy() * sku_share[:, None]
     
     # Propagate package information to SKU rows and Keep only the SKU rows
     df['SKU'] = df['SKU'].str.strip()
@@ -253,9 +276,13 @@ def load_and_clean_data(filepath, processor, header_name, extract_hyperlinks=Fal
         # Call a separate function dedicated to extracting hyperlinks
         data = extract_hyperlinks_data(filepath, header_name)
     else:
-        # Continue with the original data loading method
-        header_row_index = find_header_row(filepath, header_name)
-        data = pd.read_excel(filepath, header=header_row_index)    
+        # Open the file once and reuse the workbook (and its shared strings) for the header scan and the read
+        wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            header_row_index = find_header_row(wb, header_name)
+            data = pd.read_excel(wb, header=header_row_index, engine='openpyxl')
+        finally:
+            wb.close()
     # Extract month and year from the filename and add as a new column if necessary
     if processor in [process_B_Estoq, process_O_CtasAPagar, process_O_Estoq]:
         month_year = int(extract_month_year_from_filename(filepath))
@@ -274,21 +301,20 @@ def extract_month_year_from_filename(filename):
     else:
         return "Unknown"
 
-def convert_currency_to_float(currency_str):
-    """Convert currency string 'R$ 149,90' to float 149.90, handle mixed data types."""
-    if pd.isna(currency_str):
-        return None  # Handle missing values
-    # Check if the value is already a numeric type (float or int)
-    if isinstance(currency_str, (int, float)):
-        return float(currency_str)  # Return as float if already a number
-    # Assuming the value is a string that needs to be cleaned and converted
-    try:
-        # Remove 'R$', replace ',' with '.', and remove any spaces or periods used as thousands separators
-        normalized_str = currency_str.replace('R$', '').replace(' ', '').replace('.', '').replace(',', '.').strip()
-        return float(normalized_str)
-    except ValueError:
-        print(f"Conversion error with input '{currency_str}'")
-        return None
+def convert_currency_to_float(values):
+    """Convert a column of currency strings 'R$ 149,90' to floats 149.90, handle mixed data types."""
+    # Values that are already numeric (int or float) are kept as floats; missing values stay NaN
+    is_text = values.map(lambda x: isinstance(x, str))
+    result = pd.to_numeric(values.where(~is_text), errors='coerce')
+    # Remove 'R$', replace ',' with '.', and remove any spaces or periods used as thousands separators
+    text = values[is_text].str.replace('R$', '', regex=False).str.replace(' ', '', regex=False)
+    text = text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False).str.strip()
+    result[is_text] = pd.to_numeric(text, errors='coerce')
+    # Report the inputs that could not be converted in one line instead of one print per row
+    failed = values[is_text & result.isna()]
+    if not failed.empty:
+        print(f"Conversion error with {len(failed)} inputs: {failed.unique().tolist()}")
+    return result.astype(float)
     
 def check_and_process_files():
     raw_dir = os.path.join(base_dir, 'raw')
@@ -307,62 +333,158 @@ def check_and_process_files():
         'MLA_Vendas': (process_MLK_Vendas, "N.º de venda", True),  # New entry, same process as MLK_Vendas
         'T_EstTrans': (process_T_EstTrans, "CodProd", False)
     }
+    # Contents of each clean folder, listed once instead of probing every file with os.path.exists
+    # (save_cleaned_data creates a folder that does not exist yet)
+    clean_files = {}
     for subdir, dirs, files in os.walk(raw_dir):
+        clean_subdir = os.path.join(clean_dir, os.path.basename(subdir))
+        if clean_subdir not in clean_files:
+            clean_files[clean_subdir] = set(os.listdir(clean_subdir)) if os.path.isdir(clean_subdir) else set()
+        processed_files = clean_files[clean_subdir]
         for file in files:
             if file.endswith('.xlsx') and not file.startswith('~$'):
                 # Loop through each file type in the processing map
                 for key, (processor, header_name, use_hyperlinks) in processing_map.items():
                     if key in file:  # Check if the file type matches the key in the map
                         raw_filepath = os.path.join(subdir, file)
-                        clean_subdir = os.path.join(clean_dir, os.path.basename(subdir))
-                        clean_filepath = os.path.join(clean_subdir, file.replace('.xlsx', '_clean.xlsx'))
+                        clean_filename = file.replace('.xlsx', '_clean.xlsx')
+                        clean_filepath = os.path.join(clean_subdir, clean_filename)
                         
-                        if not os.path.exists(clean_filepath):
+                        if clean_filename not in processed_files:
                             print(f"Processing {file}...")
                             try:
                                 data = load_and_clean_data(raw_filepath, processor, header_name, use_hyperlinks)
                                 save_cleaned_data(data, clean_filepath)
+                                processed_files.add(clean_filename)
                             except Exception as e:
                                 print(f"Error processing {file}: {e}")
                         else:
                             pass
                             # print(f"Skipped {file}, already processed.")
 
+# XML namespaces of the sheet parts read by read_hyperlink_targets
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+def read_hyperlink_targets(filepath, sheet_title):
+    """Map (row, column) to hyperlink target for one sheet, reading only its hyperlink list and relationships."""
+    with zipfile.ZipFile(filepath) as archive:
+        # Resolve the sheet's part through the workbook relationships
+        workbook_xml = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        sheet_rid = next(sheet.get(f'{REL_NS}id') for sheet in workbook_xml.iter(f'{SHEET_NS}sheet') if sheet.get('name') == sheet_title)
+        workbook_rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        target = next(rel.get('Target') for rel in workbook_rels if rel.get('Id') == sheet_rid)
+        sheet_path = target[1:] if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+        # The link addresses live in the sheet's own relationships
+        rels_path = posixpath.join(posixpath.dirname(sheet_path), '_rels', posixpath.basename(sheet_path) + '.rels')
+        rel_targets = {}
+        if rels_path in archive.namelist():
+            rel_targets = {rel.get('Id'): rel.get('Target') for rel in ElementTree.fromstring(archive.read(rels_path))}
+
+        sheet_xml = archive.read(sheet_path)
+
+    # The cell values were already read by openpyxl and the hyperlink list comes after them, so parse only the
+    # sheet's opening tag (it declares the namespaces) and what follows </sheetData> instead of every cell again
+    root_tag = re.search(rb'<(?:\w+:)?worksheet\b[^>]*>', sheet_xml)
+    data_end = re.search(rb'</(?:\w+:)?sheetData>', sheet_xml)
+    if root_tag and data_end:
+        sheet_xml = root_tag.group(0) + sheet_xml[data_end.end():]
+
+    links = {}
+    for elem in ElementTree.fromstring(sheet_xml).iter(f'{SHEET_NS}hyperlink'):
+        min_col, min_row, max_col, max_row = range_boundaries(elem.get('ref'))
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                links[(row, col)] = rel_targets.get(elem.get(f'{REL_NS}id'))
+    return links
+
 def extract_hyperlinks_data(filepath, header_name):
     """Extract data and create a new column for hyperlinks for a specific header."""
-    wb = openpyxl.load_workbook(filepath, data_only=False)
-    ws = wb.active
-    data_rows = []
-    header_row_index = None
-    headers = []
-
-    # Iterate over rows to find the header and extract data
-    for row in ws.iter_rows(min_row=1, max_col=ws.max_column, values_only=False):
+    # Hyperlinks are not available in read_only mode, so the values are streamed read-only
+    # and the links are taken from the sheet's hyperlink list afterwards
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=False)
+    try:
+        ws = wb.active
+        sheet_title = ws.title
+        # Read the rows as stored instead of trusting the sheet's <dimension> (as pandas does)
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header_row_index = None
+        headers = []
+
+        # Find the header row; the rows left in the iterator are the data
+        for row_idx, row in enumerate(rows, start=1):
+            if any(header_name == (value or '') for value in row):
+                header_row_index = row_idx
+                headers = list(row)
+                break
         if header_row_index is None:
-            if any(header_name == (cell.value or '') for cell in row):
-                header_row_index = row[0].row
-                headers = [cell.value for cell in row]
-                headers.append(f"{header_name}_hyperlink")
-                continue
-        if header_row_index and row[0].row > header_row_index:
-            row_data = []
-            hyperlink_value = None
-            for cell in row:
-                if cell.column == headers.index(header_name) + 1 and cell.hyperlink:
-                    # Replace specific parts of the hyperlink
-                    hyperlink_replaced = cell.hyperlink.target.replace("https://www.mercadolivre.com.br/vendas/", "").replace("/detalhe#source=excel", "")
-                    hyperlink_value = hyperlink_replaced
-                row_data.append(cell.value)
-            row_data.append(hyperlink_value)
-            data_rows.append(row_data)
-
-    return pd.DataFrame(data_rows, columns=headers)
+            return pd.DataFrame()
+        data = pd.DataFrame(list(rows))
+    finally:
+        wb.close()
+
+    # Rows are not padded to a common width in this mode, so line the data up with the header
+    width = max(len(headers), data.shape[1])
+    headers += [None] * (width - len(headers))
+    data = data.reindex(columns=range(width))
+    data.columns = headers
+
+    # Replace specific parts of the hyperlink
+    links = read_hyperlink_targets(filepath, sheet_title)
+    link_col = headers.index(header_name) + 1
+    data[f"{header_name}_hyperlink"] = [
+        links[(row, link_col)].replace("https://www.mercadolivre.com.br/vendas/", "").replace("/detalhe#source=excel", "") if links.get((row, link_col)) else None
+        for row in range(header_row_index + 1, header_row_index + len(data) + 1)
+    ]
+
+    return data
 
 
 def save_cleaned_data(data, output_filepath):
-    """Save the cleaned data to a new Excel file."""
+    """Save the cleaned data to a new Excel file, creating its folder if needed."""
     os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
-    data.to_excel(output_filepath, index=False)
+
+    # The clean files are written once and never edited in place, so they are written with xlsxwriter,
+    # streaming the rows in constant_memory mode: each row is flushed to disk once the next one
+    # starts, so memory stays at one row. pandas writes the body column by column, which that mode cannot take,
+    # so the sheet is written here row by row with pandas' header, date and blank conventions.
+    # The workbook is written to a temporary file and only moved to output_filepath once it is complete, so a
+    # failed write never leaves a truncated clean file that check_and_process_files would take as processed
+    temp_filepath = output_filepath + '.tmp'
+    workbook = xlsxwriter.Workbook(temp_filepath, {'constant_memory': True})
+    try:
+        worksheet = workbook.add_worksheet('Sheet1')
+        worksheet.write_row(0, 0, list(data.columns), workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}))
+
+        datetime_format = workbook.add_format({'num_format': 'YYYY-MM-DD HH:MM:SS'})
+        date_format = workbook.add_format({'num_format': 'YYYY-MM-DD'})
+        datetime_cols = {col_idx for col_idx, dtype in enumerate(data.dtypes) if pd.api.types.is_datetime64_any_dtype(dtype)}
+        # Text columns may still hold the odd date read from Excel; only those columns are checked value by value
+        object_cols = {col_idx for col_idx, dtype in enumerate(data.dtypes) if dtype == object}
+
+        for row_idx, row in enumerate(data.astype(object).itertuples(index=False, name=None), start=1):
+            for col_idx, value in enumerate(row):
+                # NaN/NaT/None are left blank, as to_excel does
+                if pd.isna(value):
+                    continue
+                if col_idx in datetime_cols:
+                    worksheet.write_datetime(row_idx, col_idx, value, datetime_format)
+                elif col_idx in object_cols and isinstance(value, date):
+                    worksheet.write_datetime(row_idx, col_idx, value, datetime_format if isinstance(value, datetime) else date_format)
+                elif isinstance(value, float) and np.isinf(value):
+                    # +/-inf (the ML proportional values of an empty package) go out as text like to_excel's
+                    # default inf_rep; xlsxwriter rejects them as numbers
+                    worksheet.write_string(row_idx, col_idx, 'inf' if value > 0 else '-inf')
+                else:
+                    worksheet.write(row_idx, col_idx, value)
+        workbook.close()
+    except Exception:
+        workbook.close()
+        os.remove(temp_filepath)
+        raise
+    os.replace(temp_filepath, output_filepath)
 
 if __name__ == "__main__":
     check_and_process_files()
@@ -22,13 +22,16 @@ This script is integral to maintaining the accuracy and efficiency of inventory
 
 
 import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import NamedStyle
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import Font, PatternFill
-from openpyxl import Workbook, load_workbook
+import numpy as np
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl.utils import get_column_letter
+from openpyxl import Workbook
 import sys
+from excel_cache import read_excel_cached
 
 # Define the base directory as before, now adding the /clean part
 path_options = [
@@ -49,6 +52,31 @@ start_month = 1
 end_year = 2024
 end_month = 11
 
+# Read one clean inventory file into Codigo / Quantidade / Local columns
+# (codes are parsed as text, like T_ProdF's CodPF, so numeric codes never pick up a float '.0')
+def read_inventory_file(file_path, file_name, local_value):
+    if 'O_Estoq' in file_name:
+        # Special handling for O_Estoq
+        df = pd.read_excel(file_path, usecols=['Código do Produto', 'Quantidade', 'Local de Estoque (Código)'],
+                           dtype={'Código do Produto': str})
+        df.rename(columns={
+              'Código do Produto': 'Codigo',
+            'Quantidade': 'Quantidade',
+            'Local de Estoque (Código)': 'Local'
+        }, inplace=True)
+    elif 'T_EstTrans' in file_name:
+        # Special handling for T_EstTrans
+        df = pd.read_excel(file_path, usecols=['CodProd', 'Qt'], dtype={'CodProd': str})
+        df.rename(columns={'CodProd': 'Codigo', 'Qt': 'Quantidade'}, inplace=True)
+        df['Local'] = 'Transito'
+    else:
+        # General handling
+        df = pd.read_excel(file_path, usecols=['Código', 'Quantidade'], dtype={'Código': str})
+        df.rename(columns={'Código': 'Codigo', 'Quantidade': 'Quantidade'}, inplace=True)
+        if local_value:
+            df['Local'] = local_value
+    return df
+
 # Function to process inventory files for a given month and year
 def process_inventory_files(year, month):
     """Process and stack inventory files for a given year and month."""
@@ -70,35 +98,23 @@ def process_inventory_files(year, month):
             f'B_EFullML_{year}_{month_str}_clean.xlsx': 'ML Full'
         }
 
+        # Start every existing file's read at once (the files sit on a synced folder, so the reads
+        # mostly wait on I/O); results are collected in file order below
+        with ThreadPoolExecutor() as executor:
+            futures = {}
+            for file_name, local_value in file_configs.items():
+                file_path = os.path.join(clean_folder, file_name)
+                if os.path.exists(file_path):
+                    futures[file_name] = executor.submit(read_inventory_file, file_path, file_name, local_value)
+                else:
+                    print(f"File not found: {file_name}. Skipping this file.")
+
         combined_dfs = []
 
         # Process each file
-        for file_name, local_value in file_configs.items():
-            file_path = os.path.join(clean_folder, file_name)
+        for file_name, future in futures.items():
             try:
-                if os.path.exists(file_path):
-                    if 'O_Estoq' in file_name:
-                        # Special handling for O_Estoq
-                        df = pd.read_excel(file_path, usecols=['Código do Produto', 'Quantidade', 'Local de Estoque (Código)'])
-                        df.rename(columns={
-                              'Código do Produto': 'Codigo',
-                            'Quantidade': 'Quantidade',
-                            'Local de Estoque (Código)': 'Local'
-                        }, inplace=True)
-                    elif 'T_EstTrans' in file_name:
-                        # Special handling for T_EstTrans
-                        df = pd.read_excel(file_path, usecols=['CodProd', 'Qt'])
-                        df.rename(columns={'CodProd': 'Codigo', 'Qt': 'Quantidade'}, inplace=True)
-                        df['Local'] = 'Transito'
-                    else:
-                        # General handling
-                        df = pd.read_excel(file_path, usecols=['Código', 'Quantidade'])
-                        df.rename(columns={'Código': 'Codigo', 'Quantidade': 'Quantidade'}, inplace=True)
-                        if local_value:
-                            df['Local'] = local_value
-                    combined_dfs.append(df)
-                else:
-                    print(f"File not found: {file_name}. Skipping this file.")
+                combined_dfs.append(future.result())
             except Exception as e:
                 print(f"Error processing inventory files for {year}-{month_str}, file prefix: {file_name}: {e}")
                 continue  # Skip this file and proceed with the next
@@ -118,18 +134,14 @@ def process_inventory_files(year, month):
 
 
 
-# Function to lookup CU values and additional columns
-# Function to lookup CU values and additional columns
-def lookup_cu_values(inventory_df):
-    #print("inventory_df")
-    #print(inventory_df)
-    #print(f"inventory_df shape: {inventory_df.shape}")
-
-    """Lookup various CU values and perform additional calculations."""
+# Load the CU lookup tables once per run; they are the same for every month
+def load_cu_tables():
+    """Load T_Entradas (X = 1 rows, and those with a non-blank Pai) and T_ProdF for the CU lookups."""
     try:
         # Load T_Entradas.xlsx, ensuring Pai and Filho are treated as text
-        entradas_df = pd.read_excel(
+        entradas_df = read_excel_cached(
             os.path.join(base_dir, 'Tables', 'T_Entradas.xlsx'),
+            usecols=['Pai', 'Filho', 'X', 'Ult CU R$'],  # Only parse the columns used below
             dtype={'Pai': str, 'Filho': str}  # Treat Pai and Filho as text
         )
         # Print head of df
@@ -138,27 +150,76 @@ def lookup_cu_values(inventory_df):
         #print(f"entradas_df shape: {entradas_df.shape}")
 
         # Load T_ProdF.xlsx, ensuring CodPF and CodPP are treated as text
-        prodf_df = pd.read_excel(
+        prodf_df = read_excel_cached(
             os.path.join(base_dir, 'Tables', 'T_ProdF.xlsx'),
+            usecols=['CodPF', 'CodPP'],  # Only parse the columns used below
             dtype={'CodPF': str, 'CodPP': str}  # Treat CodPF and CodPP as text
         )
         # Print head of df
         #print("prodf_df")
         #print(prodf_df.head())
         #print(f"prodf_df shape: {prodf_df.shape}")
+        prodf_df = prodf_df.rename(columns={'CodPF': 'CodPF_Prod', 'CodPP': 'CodPP_Prod'})
 
         # Ensure unique values in key columns to avoid duplicates
         # Filter T_Entradas where X = 1
-        filtered_entradas = entradas_df[entradas_df['X'] == 1]
+        filtered_entradas = entradas_df[entradas_df['X'] == 1].copy()
+        # Coerce the unit cost once here, so the UCP/UCF columns merged from it are already numeric every month
+        filtered_entradas['Ult CU R$'] = pd.to_numeric(filtered_entradas['Ult CU R$'], errors='coerce')
         #print("filtered_entradas")
         #print(filtered_entradas.head())
         #print(f"filtered_entradas shape: {filtered_entradas.shape}")
 
+        # Check for duplicate non-blank 'Pai' values once, before any month is processed
+        filtered_entradas_with_pai = filtered_entradas[filtered_entradas['Pai'].notna() & (filtered_entradas['Pai'] != '')]
+        duplicate_pai = filtered_entradas_with_pai[filtered_entradas_with_pai.duplicated(subset=['Pai'], keep=False)]
+        #print("Duplicate Pai values in filtered_entradas_with_pai:")
+        #print(duplicate_pai)
+        if not duplicate_pai.empty:
+            print("Warning: Duplicate 'Pai' values found in T_Entradas:")
+            print(duplicate_pai)
+            print("\nPlease correct the file to ensure unique 'Pai' values.")
+            sys.exit("Execution stopped due to duplicate 'Pai' values.")
+
+        return filtered_entradas, filtered_entradas_with_pai, prodf_df
+
+    except Exception as e:
+        print(f"Error loading CU tables: {e}")
+        return None
+
+# Left-merge `right` onto `df` by df[left_on] == right[right_on] (right's key column included, as pd.merge keeps it).
+# With one right row per key (the usual case) the row positions are found in a single hash pass and the columns
+# are taken positionally, instead of a merge that rebuilds and copies every column of df; otherwise pd.merge is used.
+# left_keys is an optional pd.factorize(df[left_on]) result shared by several lookups on the same column, so the
+# rows are hashed once and each lookup only matches the distinct keys (ignored once a merge has changed the rows).
+# validate is passed to pd.merge (e.g. 'm:1'); a unique right key always satisfies it
+def lookup_merge(df, right, left_on, right_on, left_keys=None, validate=None):
+    if not right[right_on].is_unique:
+        return pd.merge(df, right, left_on=left_on, right_on=right_on, how='left', validate=validate)
+    right_keys = pd.Index(right[right_on])
+    if left_keys is not None and len(left_keys[0]) == len(df):
+        codes, uniques = left_keys
+        # the appended position is the one a missing key (code -1) picks: a missing right key, if any, as in pd.merge
+        positions = np.append(right_keys.get_indexer(uniques), right_keys.get_indexer([np.nan]))[codes]
+    else:
+        positions = right_keys.get_indexer(df[left_on])
+    df = df.reset_index(drop=True)
+    for col in right.columns:
+        df[col] = right[col].array.take(positions, allow_fill=True)
+    return df
+
+# Function to lookup CU values and additional columns
+def lookup_cu_values(inventory_df, filtered_entradas, filtered_entradas_with_pai, prodf_df):
+    #print("inventory_df")
+    #print(inventory_df)
+    #print(f"inventory_df shape: {inventory_df.shape}")
+
+    """Lookup various CU values and perform additional calculations."""
+    try:
         # Ensure that 'Codigo_Inv' is treated as text in inventory_df
         inventory_df['Codigo'] = inventory_df['Codigo'].astype(str)
         inventory_df.rename(columns={'Quantidade': 'Quantidade_Inv', 'Codigo': 'Codigo_Inv'}, inplace=True)
 
-        prodf_df.rename(columns={'CodPF': 'CodPF_Prod', 'CodPP': 'CodPP_Prod'}, inplace=True)
         #print("---- Renamed Cols:")
         #print("inventory_df")
         #print(inventory_df)
@@ -169,49 +230,41 @@ def lookup_cu_values(inventory_df):
         #print(f"prodf_df shape: {prodf_df.shape}")
 
         # Match 'Codigo_Inv' to T_ProdF['CodPF_Prod'] to get T_ProdF['CodPP_Prod'] as 'CodPP'
-        inventory_df = pd.merge(inventory_df, prodf_df[['CodPF_Prod', 'CodPP_Prod']], left_on='Codigo_Inv', right_on='CodPF_Prod', how='left')
+        # Codigo_Inv is looked up twice (here and for UCF below), so hash its values once for both lookups
+        codigo_keys = pd.factorize(inventory_df['Codigo_Inv'])
+        inventory_df = lookup_merge(inventory_df, prodf_df[['CodPF_Prod', 'CodPP_Prod']], left_on='Codigo_Inv', right_on='CodPF_Prod',
+                                    left_keys=codigo_keys)
         #print("---- Matched 1 Cols:")
         #print("inventory_df")
         #print(inventory_df)
         #print(f"inventory_df shape: {inventory_df.shape}")
 
         # Create UCP by matching CodPP_Prod to T_Entradas[Pai], but exclude rows where Pai is blank
-        filtered_entradas_with_pai = filtered_entradas[filtered_entradas['Pai'].notna() & (filtered_entradas['Pai'] != '')]
-
-        duplicate_pai = filtered_entradas_with_pai[filtered_entradas_with_pai.duplicated(subset=['Pai'], keep=False)]
-        #print("Duplicate Pai values in filtered_entradas_with_pai:")
-        #print(duplicate_pai)
-        if not duplicate_pai.empty:
-            print("Warning: Duplicate 'Pai' values found in T_Entradas:")
-            print(duplicate_pai)
-            print("\nPlease correct the file to ensure unique 'Pai' values.")
-            sys.exit("Execution stopped due to duplicate 'Pai' values.")
-
-        # Now perform the merge only with non-blank 'Pai' values
-        inventory_df = pd.merge(inventory_df,
-                                filtered_entradas_with_pai[['Pai', 'Ult CU R$']].rename(columns={'Ult CU R$': 'UCP'}),
-                                left_on='CodPP_Prod',
-                                right_on='Pai',
-                                how='left')
+        # (load_cu_tables already filtered the non-blank Pai rows and rejected duplicates)
+        inventory_df = lookup_merge(inventory_df,
+                                    filtered_entradas_with_pai[['Pai', 'Ult CU R$']].rename(columns={'Ult CU R$': 'UCP'}),
+                                    left_on='CodPP_Prod',
+                                    right_on='Pai',
+                                    validate='m:1')  # one row per Pai, as load_cu_tables guarantees
         #print("---- Create UCP by matching CodPP_Prod to T_Entradas[Pai] (non-blank Pai)")
         #print(inventory_df)
         #print(f"inventory_df shape after merge: {inventory_df.shape}")
 
         # Create UCF by matching Codigo_Inv to T_Entradas[Filho]
-        inventory_df = pd.merge(inventory_df, filtered_entradas[['Filho', 'Ult CU R$']].rename(columns={'Ult CU R$': 'UCF'}),
-                                left_on='Codigo_Inv', right_on='Filho', how='left')
+        inventory_df = lookup_merge(inventory_df, filtered_entradas[['Filho', 'Ult CU R$']].rename(columns={'Ult CU R$': 'UCF'}),
+                                    left_on='Codigo_Inv', right_on='Filho', left_keys=codigo_keys)
         #print("---- Create UCP by matching CodPP_Prod to T_Entradas[Filho]")
         #print("inventory_df")
         #print(inventory_df)
         #print(f"inventory_df shape: {inventory_df.shape}")
 
-        # Ensure 'Quantidade_Inv', 'UCP', and 'UCF' are numeric (force conversion)
+        # Ensure 'Quantidade_Inv' is numeric (force conversion); 'UCP' and 'UCF' come from the already numeric 'Ult CU R$'
         inventory_df['Quantidade_Inv'] = pd.to_numeric(inventory_df['Quantidade_Inv'], errors='coerce').fillna(0)
-        inventory_df['UCP'] = pd.to_numeric(inventory_df['UCP'], errors='coerce').fillna(0)
-        inventory_df['UCF'] = pd.to_numeric(inventory_df['UCF'], errors='coerce').fillna(0)
+        inventory_df[['UCP', 'UCF']] = inventory_df[['UCP', 'UCF']].fillna(0)
 
         # Create UCU: If UCP > 0, use UCP; otherwise, use UCF
-        inventory_df['UCU'] = inventory_df.apply(lambda row: row['UCP'] if row['UCP'] > 0 else row['UCF'], axis=1)
+        # (picked for the whole column at once instead of calling a lambda on every boxed row)
+        inventory_df['UCU'] = inventory_df['UCP'].where(inventory_df['UCP'] > 0, inventory_df['UCF'])
 
         # Create UCT: UCU * Quantidade_Inv
         inventory_df['UCT'] = inventory_df['UCU'] * inventory_df['Quantidade_Inv']
@@ -224,7 +277,15 @@ def lookup_cu_values(inventory_df):
 
 
 # Main function to handle the process for all months within the date range
-def process_all_months():
+def process_all_months(start_year=start_year, start_month=start_month, end_year=end_year, end_month=end_month):
+    output_filepaths = []
+
+    # Load the CU lookup tables once for all months
+    cu_tables = load_cu_tables()
+    if cu_tables is None:
+        return output_filepaths
+    filtered_entradas, filtered_entradas_with_pai, prodf_df = cu_tables
+
     # Loop through each year and month in the specified range
     for year in range(start_year, end_year + 1):
         for month in range(1, 13):
@@ -241,7 +302,7 @@ def process_all_months():
                 continue
 
             # Step 2: Lookup CU values and calculate UCU and UCT
-            final_df = lookup_cu_values(inventory_df)
+            final_df = lookup_cu_values(inventory_df, filtered_entradas, filtered_entradas_with_pai, prodf_df)
             if final_df is None:
                 continue
 
@@ -249,45 +310,79 @@ def process_all_months():
             final_df['AnoMes'] = (year % 100) * 100 + month
             # Step 3: Save the resulting dataframe to a new Excel file
             output_filepath = os.path.join(base_dir, 'clean',f'{year}_{month:02d}', f'R_Estoq_fdm_{year}_{month:02d}.xlsx')
-            final_df.to_excel(output_filepath, index=False, sheet_name='Data')
+            # Data, formatting and pivot are streamed into the workbook and saved once
+            format_and_add_pivot(output_filepath, final_df, year, month)
             print(f"Saved combined inventory data for {year}-{month:02d} to {output_filepath}")
-            format_and_add_pivot(output_filepath, final_df, year,month)
             print(f"Added Formating and Pivots for {year}-{month:02d} to {output_filepath}")
+            output_filepaths.append(output_filepath)
+
+    return output_filepaths
 
-# Format and add pivot tables using openpyxl
+# Format and add pivot tables using openpyxl's write-only mode: every cell is styled as its row is
+# appended, so the workbook is never held as a full cell model and is saved once
 def format_and_add_pivot(output_filepath, df, year, month):
-    # Load the workbook
-    wb = load_workbook(output_filepath)
-    ws = wb['Data']
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title='Data')
     
     # Apply number format to specified columns
     number_format = '#,##0.00'
     columns_to_format = ['UCP', 'UCF', 'UCU', 'UCT']
-    # Add autofilter to the pivot table
-    ws.auto_filter.ref = ws.dimensions
-
-    for col in columns_to_format:
-        if col in df.columns:
-            col_idx = df.columns.get_loc(col) + 1  # Adjust for Excel's 1-based indexing
-            for row in range(2, len(df) + 2):  # Start from the second row (excluding header)
-                cell = ws.cell(row=row, column=col_idx)
-                cell.number_format = number_format
+    format_idx = [df.columns.get_loc(col) for col in columns_to_format if col in df.columns]
+
+    # Header keeps the look pandas gave it (bold, thin borders, centered)
+    header_font = Font(bold=True)
+    thin = Side(style='thin')
+    header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_alignment = Alignment(horizontal='center', vertical='top')
+    header = []
+    for col_name in df.columns:
+        cell = WriteOnlyCell(ws, value=col_name)
+        cell.font = header_font
+        cell.border = header_border
+        cell.alignment = header_alignment
+        header.append(cell)
+    ws.append(header)
+
+    # One formatted cell per column, reused on every row (each row is serialized as soon as it is appended)
+    format_cells = []
+    for col_idx in format_idx:
+        cell = WriteOnlyCell(ws)
+        cell.number_format = number_format
+        format_cells.append((col_idx, cell))
+
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        row = list(row)
+        for col_idx, cell in format_cells:
+            value = row[col_idx]
+            if value is not None:
+                cell.value = value
+                row[col_idx] = cell
+        ws.append(row)
+
+    # Add autofilter to the data sheet
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(df.columns))}{len(df) + 1}"
     
-    # Create a pivot table on a new sheet
-    pivot_table = df.pivot_table(
-       index='Codigo_Inv',
-        columns='Local',
-        values='Quantidade_Inv',
-        aggfunc='sum',
-        fill_value=0
-    )
+    # Create a pivot table on a new sheet (codes x locations, like pivot_table it skips blank keys):
+    # factorize both keys once (sorted, like groupby) and scatter-add the quantities straight into
+    # the code x location grid with bincount, instead of a groupby followed by unstack
+    code_ids, codes = pd.factorize(df['Codigo_Inv'], sort=True)
+    local_ids, locals_ = pd.factorize(df['Local'], sort=True)
+    has_keys = (code_ids >= 0) & (local_ids >= 0)
+    quantities = np.nan_to_num(df['Quantidade_Inv'].to_numpy(dtype=float))
+    grid = np.bincount(code_ids[has_keys] * len(locals_) + local_ids[has_keys], weights=quantities[has_keys],
+                       minlength=len(codes) * len(locals_)).reshape(len(codes), len(locals_))
+    in_pivot = np.bincount(code_ids[has_keys], minlength=len(codes)) > 0  # codes with at least one located row
+    pivot_table = pd.DataFrame(grid[in_pivot], index=pd.Index(codes[in_pivot], name='Codigo_Inv'), columns=pd.Index(locals_, name='Local'))
+    if pd.api.types.is_integer_dtype(df['Quantidade_Inv']):
+        pivot_table = pivot_table.astype(df['Quantidade_Inv'].dtype)
 ############################################
     # Ensure total column is correct
     pivot_table['Total'] = pivot_table.sum(axis=1)
 
-    # Add a total cost column
-    total_cost = df.groupby('Codigo_Inv')['UCT'].sum()
-    pivot_table['Total Cost'] = total_cost
+    # Add a total cost column (all locations of a code, including blank ones)
+    has_code = code_ids >= 0
+    total_cost = np.bincount(code_ids[has_code], weights=np.nan_to_num(df['UCT'].to_numpy(dtype=float)[has_code]), minlength=len(codes))
+    pivot_table['Total Cost'] = total_cost[in_pivot]
 
     # Add a unit cost column
     pivot_table['Unit Cost'] = pivot_table['Total Cost'] / pivot_table['Total']
@@ -302,10 +397,13 @@ def format_and_add_pivot(output_filepath, df, year, month):
     print(f"Pivot Table Total Cost: {pivot_total_cost}")
 
     # Check for mismatched rows
-    unmatched_rows = df[~df['Codigo_Inv'].isin(pivot_table.index)]
+    # (the pivot's codes are exactly the factorized codes kept in in_pivot, so look the row codes up in that
+    # mask instead of hashing every code string again; the appended False is what a blank code (-1) picks)
+    unmatched_rows = df[~np.append(in_pivot, False)[code_ids]]
     if not unmatched_rows.empty:
-        print("Unmatched rows found:")
-        print(unmatched_rows)
+        # Summarize instead of printing the whole frame
+        print(f"Unmatched rows found: {len(unmatched_rows)}")
+        print(unmatched_rows.head())
     else:
         print('### No unmatched rows ###')
         
@@ -315,46 +413,47 @@ def format_and_add_pivot(output_filepath, df, year, month):
     pivot_table = pivot_table.reset_index()
 
     # Add the pivot table to a new sheet
-    pivot_sheet_name = 'PT01'
-    if pivot_sheet_name not in wb.sheetnames:
-        wb.create_sheet(title=pivot_sheet_name)
-    pivot_ws = wb[pivot_sheet_name]
-    
-    # Write headers
-    for col_idx, header in enumerate(pivot_table.columns, start=1):
-        pivot_ws.cell(row=1, column=col_idx, value=header)
-
-    # Write the pivot table data
-    for r_idx, row in enumerate(pivot_table.itertuples(index=False), start=2):
-        for c_idx, value in enumerate(row, start=1):
-            pivot_ws.cell(row=r_idx, column=c_idx, value=value)
+    pivot_ws = wb.create_sheet(title='PT01')
     
-    # Add totals row at the bottom
-    totals_row_idx = len(pivot_table) + 2
-    pivot_ws.cell(row=totals_row_idx, column=1, value="Grand Total").font = Font(bold=True)
-    for col_idx, col_name in enumerate(pivot_table.columns[1:], start=2):  # Skip 'CodPF_Prod'
-        total_value = pivot_table[col_name].sum()
-        cell = pivot_ws.cell(row=totals_row_idx, column=col_idx, value=total_value)
-        cell.font = Font(bold=True)
-        if col_name in ['Total Cost', 'Unit Cost']:
-            cell.number_format = number_format
-
-    # Apply formatting to the last 3 columns (bold + light gray fill)
+    # Style objects are created once and shared by every cell they are applied to
+    bold_font = Font(bold=True)
     gray_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-    for col_name in ['Total', 'Total Cost', 'Unit Cost']:
-        col_idx = pivot_table.columns.get_loc(col_name) + 1
-        for row in range(2, totals_row_idx + 1):  # Include totals row
-            cell = pivot_ws.cell(row=row, column=col_idx)
-            cell.font = Font(bold=True)
-            cell.fill = gray_fill
-            cell.number_format = number_format
+    gray_idx = {pivot_table.columns.get_loc(col_name) for col_name in ['Total', 'Total Cost', 'Unit Cost']}
+
+    def styled_row(values, bold_idx):
+        # Last 3 columns (Total, Total Cost, Unit Cost) are bold, light gray and number formatted
+        row = []
+        for col_idx, value in enumerate(values):
+            cell = WriteOnlyCell(pivot_ws, value=value)
+            if col_idx in gray_idx:
+                cell.font = bold_font
+                cell.fill = gray_fill
+                cell.number_format = number_format
+            elif col_idx in bold_idx:
+                cell.font = bold_font
+            row.append(cell)
+        return row
+
+    # Write headers and pivot table data a whole row at a time
+    pivot_ws.append(list(pivot_table.columns))
+    for row in pivot_table.itertuples(index=False, name=None):
+        pivot_ws.append(styled_row(row, bold_idx=()))
+
+    # Add totals row at the bottom
+    totals = ["Grand Total"] + [pivot_table[col_name].sum() for col_name in pivot_table.columns[1:]]  # Skip 'CodPF_Prod'
+    pivot_ws.append(styled_row(totals, bold_idx=range(len(totals))))
 
     # Add autofilter to the pivot table
-    pivot_ws.auto_filter.ref = pivot_ws.dimensions
+    pivot_ws.auto_filter.ref = f"A1:{get_column_letter(len(pivot_table.columns))}{len(pivot_table) + 2}"
 
-    # Save the workbook
     wb.save(output_filepath)
 
 
 if __name__ == "__main__":
-    process_all_months()
+    parser = argparse.ArgumentParser(description="Stack monthly inventory files, look up CU values and add pivots.")
+    parser.add_argument('--start-year', type=int, default=start_year, help="First year to process")
+    parser.add_argument('--start-month', type=int, default=start_month, help="First month to process")
+    parser.add_argument('--end-year', type=int, default=end_year, help="Last year to process")
+    parser.add_argument('--end-month', type=int, default=end_month, help="Last month to process")
+    args = parser.parse_args()
+    process_all_months(args.start_year, args.start_month, args.end_year, args.end_month)
@@ -18,13 +18,17 @@ This script is integral to maintaining data accuracy and efficiency in the repor
 
 
 import pandas as pd
+import numpy as np
 from pandas.tseries.offsets import MonthEnd
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from openpyxl import load_workbook
-from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment
-import re
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+from excel_cache import read_excel_cached
 
 # Define the potential base directories
 path_options = [
@@ -42,6 +46,7 @@ else:
     base_dir = None  # Or set a default path if appropriate
 print("Base directory set to:", base_dir)
 static_dir = os.path.join(base_dir, 'Tables')
+
 inventory_file_path = os.path.join(static_dir, 'R_EstoqComp.xlsx')  # Update to the correct path if needed
 
 column_rename_dict = {
@@ -114,12 +119,8 @@ def rename_columns(all_data, column_rename_dict):
     for df_name, rename_dict in column_rename_dict.items():
         if df_name in all_data:
             df = all_data[df_name]
-            # Debug print to verify columns before renaming
-            print(f"Before rename:\nTable: {df_name}\nColumns: {df.columns.tolist()}")
             df.rename(columns=rename_dict, inplace=True)
-            # Debug print to verify columns after renaming
-            print(f"Renamed columns in {df_name}: {rename_dict}")
-            print(f"Columns in {df_name}: {df.columns.tolist()}")
+            print(f"Renamed {len(rename_dict)} columns in {df_name}")
             all_data[df_name] = df
     return all_data
 
@@ -143,7 +144,8 @@ def load_recent_data(base_dir, file_pattern, start_date=None, end_date=None):
         year_month = current_date.strftime('%Y_%m')
         file_path = os.path.join(base_dir, 'clean', year_month, file_pattern.format(year_month=year_month))
         if os.path.exists(file_path):
-            df = pd.read_excel(file_path)
+            # Clean monthly files only change when process_data rewrites them, so reuse their pickle copy until then
+            df = read_excel_cached(file_path)
             frames.append(df)
             print(f"Loaded {file_path} with shape: {df.shape}")  # Debug print
         else:
@@ -151,17 +153,27 @@ def load_recent_data(base_dir, file_pattern, start_date=None, end_date=None):
         # Increment by one month using relativedelta
         current_date += relativedelta(months=1)
 
+    # A single month (the default range) is returned as read; concat would only copy the whole frame
+    if len(frames) == 1:
+        return frames[0]
     return pd.concat(frames) if frames else pd.DataFrame()
 
+# Read a static table through the Tables/.cache pickle copy
 def load_static_data(static_dir, filename):
-    return pd.read_excel(os.path.join(static_dir, filename))
+    return read_excel_cached(os.path.join(static_dir, filename))
 
 def standardize_text_case(df):
     """Convert all text to uppercase for standardization."""
     if isinstance(df, pd.DataFrame):
         df.columns = [col.upper() for col in df.columns]
         for col in df.select_dtypes(include=[object]).columns:
-            df[col] = df[col].str.upper()
+            # Uppercase each distinct value once and map it back through the factorized codes;
+            # columns that are already uppercase and complete (codes, order numbers, ...) are left as they are
+            codes, uniques = pd.factorize(df[col])
+            uniques = pd.Series(uniques, dtype=object)
+            upper = uniques.str.upper()
+            if not upper.equals(uniques) or (codes < 0).any():
+                df[col] = upper.reindex(codes).to_numpy()
     return df
 
 def merge_all_data(all_data):
@@ -207,9 +219,7 @@ def merge_all_data(all_data):
     all_data = merge_data(all_data, "O_NFCI", "NOMEF", "T_Verbas", "NomeF", "VERBAPCT", default_value=0)
 
     # Perform the merge (example merge, adjust as necessary)
-    all_data = merge_data(all_data, "L_LPI", "INTEGRAÇÃO", "T_MP", "Integração", "Empresa", default_value='erro')
-    all_data = merge_data(all_data, "L_LPI", "INTEGRAÇÃO", "T_MP", "Integração", "MP", default_value='erro')
-    all_data = merge_data(all_data, "L_LPI", "INTEGRAÇÃO", "T_MP", "Integração", "EmpresaF", default_value='erro')
+    all_data = merge_data(all_data, "L_LPI", "INTEGRAÇÃO", "T_MP", "Integração", ["Empresa", "MP", "EmpresaF"], default_value='erro')
 
     # OrderStatus Merge
     all_data = merge_data(all_data, "MLA_Vendas", "STATUS", "T_MLStatus", "MLStatus", "OrderStatus", default_value='erro')
@@ -220,10 +230,7 @@ def merge_all_data(all_data):
     all_data = merge_data(all_data, "O_CtasARec", "CATEGORIA", "T_CtasAPagarClass", "Categoria", "GrupoCtasAPagar", default_value='erro')
 
     # CC
-    all_data = merge_data(all_data, "O_CC", "CATEGORIA", "T_CCCats", "CC_Categoria Omie", "CC_Cat SG", default_value='erro')
-    all_data = merge_data(all_data, "O_CC", "CATEGORIA", "T_CCCats", "CC_Categoria Omie", "CC_Cat Grp", default_value='erro')
-    all_data = merge_data(all_data, "O_CC", "CATEGORIA", "T_CCCats", "CC_Categoria Omie", "CC_B2X", default_value='erro')
-    all_data = merge_data(all_data, "O_CC", "CATEGORIA", "T_CCCats", "CC_Categoria Omie", "CC_Tipo", default_value='erro')
+    all_data = merge_data(all_data, "O_CC", "CATEGORIA", "T_CCCats", "CC_Categoria Omie", ["CC_Cat SG", "CC_Cat Grp", "CC_B2X", "CC_Tipo"], default_value='erro')
     
     for key, df in all_data.items():
         if key == 'O_NFCI':
@@ -232,8 +239,8 @@ def merge_all_data(all_data):
             # Create column "C"
             df['C'] = 1 - df['REM_NF']
             
-            # Create column "B"
-            df['B'] = df.apply(lambda row: 1 if row['OP'] == 'REMESSA DE PRODUTO' and row['C'] == 1 else 0, axis=1)
+            # Create column "B" (a 0/1 flag, stored as int8 like L_LPI's VALIDO and KAB)
+            df['B'] = ((df['OP'] == 'REMESSA DE PRODUTO') & (df['C'] == 1)).astype('int8')
             
             # Create column ECT (ECU x QTD)
             df['ECT'] = df['ECU'] * df['QTD'] * df['C']
@@ -243,7 +250,11 @@ def merge_all_data(all_data):
 
             # Create column FreteVLR (FretePCT x TotalNF)            
             #df['FRETEVLR'] = df['FRETEPCT'] * df['TOTALNF'] * df['C']
-            df['FRETEVLR'] = df.apply(lambda row: max(row['FRETEPCT'] * row['TOTALNF'] * row['C'], row['FRETEPCT'] * row['ECT'] * row['C'] * 2), axis=1)
+            # Larger of the freight on the invoice total and twice the freight on the cost; like max(), the invoice
+            # value is kept unless the cost value is strictly greater (so a missing invoice value stays missing)
+            frete_nf = df['FRETEPCT'] * df['TOTALNF'] * df['C']
+            frete_ct = df['FRETEPCT'] * df['ECT'] * df['C'] * 2
+            df['FRETEVLR'] = frete_nf.mask(frete_ct > frete_nf, frete_ct)
 
             # Create column VerbaVLR (VerbaPCT x TotalNF)
             df['VERBAVLR'] = df['VERBAPCT'] * df['TOTALNF'] * df['C']
@@ -258,11 +269,12 @@ def merge_all_data(all_data):
             cols_to_drop = ['PREÇO', 'PREÇO TOTAL', 'DESCONTO ITEM', 'DESCONTO TOTAL']
             df = df.drop([x for x in cols_to_drop if x in df.columns], axis=1)
             # Add the 'Valido' column directly
-            df['VALIDO'] = df['STATUS PEDIDO'].apply(lambda x: 0 if x in ['CANCELADO', 'PENDENTE', 'AGUARDANDO PAGAMENTO'] else 1)
-            df['KAB'] = df.apply(lambda row: 1 if row['VALIDO'] == 1 and row['EMPRESA'] in ['K', 'A', 'B'] else 0, axis=1)
+            df['VALIDO'] = (~df['STATUS PEDIDO'].isin(['CANCELADO', 'PENDENTE', 'AGUARDANDO PAGAMENTO'])).astype('int8')
+            df['KAB'] = ((df['VALIDO'] == 1) & df['EMPRESA'].isin(['K', 'A', 'B'])).astype('int8')
             df['ECTK'] = df['ECU'] * df['QTD'] * df['KAB']
 
             # Add the 'TipoAnuncio' column directly from 'MLK_Vendas'
+            # (a merge, not a map: package orders repeat the order key, one row per SKU)
             if 'MLK_Vendas' in all_data:
                 df = df.merge(
                     all_data['MLK_Vendas'][['N.º DE VENDA_HYPERLINK', 'TIPO DE ANÚNCIO']],
@@ -270,7 +282,7 @@ def merge_all_data(all_data):
                     right_on='N.º DE VENDA_HYPERLINK',
                     how='left'
                 )
-                df['TipoAnuncio'] = df.apply(lambda row: row['TIPO DE ANÚNCIO'] if row['EMPRESA'] == 'K' and row['MP'] == 'ML' else None, axis=1)
+                df['TipoAnuncio'] = df['TIPO DE ANÚNCIO'].astype(object).where((df['EMPRESA'] == 'K') & (df['MP'] == 'ML'), None)
                 df.drop(columns=['N.º DE VENDA_HYPERLINK', 'TIPO DE ANÚNCIO'], inplace=True)
 
             # Add the 'TipoAnuncio' column for 'A' and lookup in 'MLA_Vendas'
@@ -281,32 +293,18 @@ def merge_all_data(all_data):
                     right_on='N.º DE VENDA_HYPERLINK',
                     how='left'
                 )
-                df['TipoAnuncio'] = df.apply(lambda row: row['TIPO DE ANÚNCIO'] if row['EMPRESA'] == 'A' and row['MP'] == 'ML' else row['TipoAnuncio'], axis=1)
+                df['TipoAnuncio'] = df['TIPO DE ANÚNCIO'].astype(object).where((df['EMPRESA'] == 'A') & (df['MP'] == 'ML'), df['TipoAnuncio'])
                 df.drop(columns=['N.º DE VENDA_HYPERLINK', 'TIPO DE ANÚNCIO'], inplace=True)
 
-            # Add colum Compctmp (Comissão pct por Marketplace)
+            # Add colum Compctmp (Comissão pct por Marketplace) and Compctml (Comissão pct pro ML Classico/Premium)
+            # Both read the same MPX -> TARMP rule, so they are looked up in one keyed Series instead of merging the table twice
             if 'T_RegrasMP' in all_data:
-                df = df.merge(
-                    all_data['T_RegrasMP'][['MPX', 'TARMP']],
-                    left_on='MP',
-                    right_on='MPX',
-                    how='left'
-                )
-                df['Compctmp'] = df['TARMP']
-                df.drop(columns=['MPX', 'TARMP'], inplace=True)
-
-            # Add colum Compctml (Comissão pct pro ML Classico/Premium)
-                df = df.merge(
-                    all_data['T_RegrasMP'][['MPX', 'TARMP']],
-                    left_on='TipoAnuncio',
-                    right_on='MPX',
-                    how='left'
-                )
-                df['Compctml'] = df['TARMP']
-                df.drop(columns=['MPX', 'TARMP'], inplace=True)
+                tarmp = all_data['T_RegrasMP'].drop_duplicates('MPX').set_index('MPX')['TARMP']
+                df['Compctmp'] = df['MP'].map(tarmp)
+                df['Compctml'] = df['TipoAnuncio'].map(tarmp)
 
             # Create the ComPct column based on the condition
-            df['ComPct'] = df.apply(lambda row: row['Compctml'] if pd.notnull(row['Compctml']) else row['Compctmp'], axis=1)
+            df['ComPct'] = df['Compctml'].combine_first(df['Compctmp'])
             df['Com'] = df['VLRVENDA'] * df['ComPct'] * df['KAB']
 
         elif key == 'MLA_Vendas':
@@ -338,19 +336,23 @@ def merge_all_data(all_data):
             # Step 2: Create the 'DATA BASE' column which is the last day of the month
             df['DATA BASE'] = pd.to_datetime(df['ANOMES'], format='%y%m') + MonthEnd(0)
             # Step 3: Calculate 'DIAS ATRASO'
-            df['DIAS ATRASO'] = (df['DATA BASE'] - df['VENCIMENTO']).dt.days
+            dias_atraso = (df['DATA BASE'] - df['VENCIMENTO']).dt.days
             # Step 4: Apply condition to set DIAS ATRASO to 0 if VENCIMENTO is greater than DATA BASE
-            df['DIAS ATRASO'] = df['DIAS ATRASO'].apply(lambda x: max(0, x))
+            # (one vectorized pass; a missing day count becomes 0 as well, as max(0, x) did), so the column is written once
+            df['DIAS ATRASO'] = dias_atraso.where(dias_atraso > 0, 0)
             # Step 5: Classify 'DIAS ATRASO' using the classification table from all_data['T_CtasARecClass']
             df_ctas_a_rec_class = all_data['T_CtasARecClass']
 
+            # Keep only the rows the classification table covers before merging; the others were dropped after the merge anyway
+            df = df[df['DIAS ATRASO'].notna() & df['DIAS ATRASO'].isin(df_ctas_a_rec_class['DEXDIAS'])]
+
             # Merge based on the 'DIAS ATRASO' column and classification table
             df = pd.merge(df, df_ctas_a_rec_class, how='left', left_on='DIAS ATRASO', right_on='DEXDIAS')
         
-            # Apply the range condition for 'DIAS ATRASO' to determine classification
-            df['CLASSIFICACAO'] = df.apply(lambda row: row['STATUS ATRASO'] if row['DEXDIAS'] <= row['DIAS ATRASO'] <= row['DEXDIAS'] else None, axis=1)
+            # Every remaining row matched its DEXDIAS, so the range condition holds and the status is the classification
+            df['CLASSIFICACAO'] = df['STATUS ATRASO']
         
-            # Filter out rows where the classification was not within the proper range
+            # Filter out rows without a classification
             df = df.dropna(subset=['CLASSIFICACAO'])
 
         # Update the dataframe in all_data
@@ -364,39 +366,58 @@ def preprocess_inventory_data(file_path):
 
     for sheet_name, df in sheets.items():
         df = df.melt(id_vars=['CodPF'], var_name='ANOMES', value_name='Value')
-        df['ANOMES'] = pd.to_datetime(df['ANOMES'], errors='coerce').dt.strftime('%y%m')
+        df['ANOMES'] = anomes_from_dates(pd.to_datetime(df['ANOMES'], errors='coerce'))
         processed_sheets[sheet_name] = df
     
     return processed_sheets
 
 def merge_data(all_data, df1_name, df1_col, df2_name, df2_col, new_col=None, indicator_name=None, default_value=None):
+    # new_col may be a single column or a list of columns to bring over from df2 in one merge
     df1_col = df1_col.upper()
     df2_col = df2_col.upper()
-    if new_col:
-        new_col = new_col.upper()
+    if isinstance(new_col, str):
+        new_col = [new_col]
+    new_cols = [col.upper() for col in new_col] if new_col else []
 
     if df1_name in all_data and df2_name in all_data:
         df1 = all_data[df1_name]
         df2 = all_data[df2_name]
 
-        # Standardize column names
-        df1.columns = [col.upper() for col in df1.columns]
-        df2.columns = [col.upper() for col in df2.columns]
+        # Column names were already uppercased once by standardize_text_case in merge_all_data
 
         if df1_col not in df1.columns or df2_col not in df2.columns:
             raise KeyError(f"Column '{df1_col}' or '{df2_col}' not found in dataframes.")
 
-        df2_cols = [df2_col] + ([new_col] if new_col else [])
-        merged_df = df1.merge(df2[df2_cols].drop_duplicates(), left_on=df1_col, right_on=df2_col, how='left', indicator=indicator_name, suffixes=('', '_DROP'))
+        df2_cols = [df2_col] + new_cols
+        lookup = df2[df2_cols].drop_duplicates()
+        if indicator_name is None and lookup[df2_col].is_unique and df1[df1_col].dtype == lookup[df2_col].dtype:
+            # One lookup row per key (the usual case): find each df1 key's row position in a single hash pass and
+            # add the looked-up columns in place, instead of a merge that copies every column of df1.
+            # Same result as the left merge below: row order kept, index renumbered, unmatched keys get NaN,
+            # df2's key column added when it has another name, and columns df1 already has are kept.
+            # Unlike the merge, this renumbers and extends all_data[df1_name] itself rather than a new frame
+            # (it is replaced by the result below anyway). Keys of different dtypes take the merge, which
+            # matches or rejects them as it always did instead of finding no positions
+            positions = pd.Index(lookup[df2_col]).get_indexer(df1[df1_col])
+            merged_df = df1
+            merged_df.index = pd.RangeIndex(len(merged_df))
+            for col in ([df2_col] if df2_col != df1_col else []) + new_cols:
+                if col not in merged_df.columns:
+                    merged_df[col] = lookup[col].array.take(positions, allow_fill=True)
+        else:
+            merged_df = df1.merge(lookup, left_on=df1_col, right_on=df2_col, how='left', indicator=indicator_name, suffixes=('', '_DROP'))
 
-        # Remove the '_DROP' columns
-        merged_df.drop([col for col in merged_df.columns if col.endswith('_DROP')], axis=1, inplace=True)
+            # Remove the '_DROP' columns
+            merged_df.drop([col for col in merged_df.columns if col.endswith('_DROP')], axis=1, inplace=True)
 
-        if indicator_name and default_value is not None:
-            merged_df[indicator_name] = merged_df[indicator_name].apply(lambda x: default_value if x == 'left_only' else merged_df[new_col])
-            merged_df.drop(columns=[new_col, indicator_name], inplace=True)
-        elif new_col and default_value is not None:
-            merged_df[new_col] = merged_df[new_col].fillna(default_value)
+        if indicator_name and new_cols and default_value is not None:
+            # Use the merge indicator directly: rows without a match get the default value
+            unmatched = merged_df[indicator_name] == 'left_only'
+            for col in new_cols:
+                merged_df[col] = merged_df[col].where(~unmatched, default_value)
+            merged_df.drop(columns=[indicator_name], inplace=True)
+        elif new_cols and default_value is not None:
+            merged_df[new_cols] = merged_df[new_cols].fillna(default_value)
 
         all_data[df1_name] = merged_df
     return all_data
@@ -413,9 +434,7 @@ def merge_data2v(all_data, df1_name, df1_col1, df1_col2, df2_name, df2_col1, df2
         df1 = all_data[df1_name]
         df2 = all_data[df2_name]
 
-        # Standardize column names
-        df1.columns = [col.upper() for col in df1.columns]
-        df2.columns = [col.upper() for col in df2.columns]
+        # Column names were already uppercased once by standardize_text_case in merge_all_data
 
         #print(f"Columns in {df1_name} before merge: {df1.columns}")
         #print(f"Columns in {df2_name} before merge: {df2.columns}")
@@ -439,33 +458,18 @@ def merge_data2v(all_data, df1_name, df1_col1, df1_col2, df2_name, df2_col1, df2
         all_data[df1_name] = merged_df
     return all_data
 
+def anomes_from_dates(dates):
+    # YYMM as an integer key instead of a strftime string. YYMM never exceeds 9912, so it fits int16; the
+    # nullable Int16 keeps missing dates as <NA>, written out as a blank cell rather than a fake period
+    anomes = (dates.dt.year % 100) * 100 + dates.dt.month
+    return anomes.astype('Int16')
+
 def compute_NFCI_ANOMES(all_data):
     for key, df in all_data.items():
         # Add the ANOMES column to O_NFCI
         if key == 'O_NFCI' and 'EMISS' in df.columns:
             df['EMISS'] = pd.to_datetime(df['EMISS'], errors='coerce')  # Ensure the date is parsed correctly
-            df['ANOMES'] = df['EMISS'].dt.strftime('%y%m')  # Format date as YYMM
-            print(f"Added ANOMES column to {key}")
-        all_data[key] = df
-    return all_data
-
-def compute_LPI_ANOMES(all_data):
-    for key, df in all_data.items():
-        # Add the ANOMES column to L_LPI
-        if key == 'L_LPI' and 'DATA' in df.columns:
-            df['DATA'] = pd.to_datetime(df['DATA'], errors='coerce')  # Ensure the date is parsed correctly
-            df['ANOMES'] = df['DATA'].dt.strftime('%y%m')  # Format date as YYMM
-            print(f"Added ANOMES column to {key}")
-        all_data[key] = df
-    return all_data
-
-def compute_ML_ANOMES(all_data):
-    for key, df in all_data.items():
-        # Add the ANOMES column to MLA_Vendas and MLK_Vendas
-        if key in ['MLA_Vendas', 'MLK_Vendas'] and 'DATA DA VENDA' in df.columns:
-            # Use dateutil parser to parse the date string
-            df['DATA DA VENDA'] = df['DATA DA VENDA'].apply(lambda x: parser.parse(x, fuzzy=True) if pd.notnull(x) else pd.NaT)
-            df['ANOMES'] = df['DATA DA VENDA'].dt.strftime('%y%m')  # Format date as YYMM
+            df['ANOMES'] = anomes_from_dates(df['EMISS'])  # Format date as YYMM
             print(f"Added ANOMES column to {key}")
         all_data[key] = df
     return all_data
@@ -475,7 +479,7 @@ def compute_LPI_ANOMES(all_data):
         # Add the ANOMES column to L_LPI
         if key == 'L_LPI' and 'DATA' in df.columns:
             df['DATA'] = pd.to_datetime(df['DATA'], errors='coerce')  # Ensure the date is parsed correctly
-            df['ANOMES'] = df['DATA'].dt.strftime('%y%m')  # Format date as YYMM
+            df['ANOMES'] = anomes_from_dates(df['DATA'])  # Format date as YYMM
             print(f"Added ANOMES column to {key}")
         all_data[key] = df
     return all_data
@@ -485,35 +489,42 @@ def compute_CC_ANOMES(all_data):
         # Add the ANOMES column to L_LPI
         if key == 'O_CC' and 'DATA' in df.columns:
             df['DATA'] = pd.to_datetime(df['DATA'], errors='coerce')  # Ensure the date is parsed correctly
-            df['ANOMES'] = df['DATA'].dt.strftime('%y%m')  # Format date as YYMM
+            df['ANOMES'] = anomes_from_dates(df['DATA'])  # Format date as YYMM
             print(f"Added ANOMES column to {key}")
         all_data[key] = df
     return all_data
 
-def mlcustom_date_parser(date_str):
+# Portuguese month names in the Mercado Livre sale dates and their English names for %B
+ml_month_map = {
+    'JANEIRO': 'January', 'FEVEREIRO': 'February', 'MARÇO': 'March', 'ABRIL': 'April',
+    'MAIO': 'May', 'JUNHO': 'June', 'JULHO': 'July', 'AGOSTO': 'August',
+    'SETEMBRO': 'September', 'OUTUBRO': 'October', 'NOVEMBRO': 'November', 'DEZEMBRO': 'December'
+}
+ml_month_pattern = '|'.join(ml_month_map)
+
+def mlcustom_date_parser(dates):
+    """Parse a column of Mercado Livre sale dates such as '12 DE JANEIRO DE 2024 10:30 HS.' (blanks give NaT)."""
+    # Every row of a package repeats its sale date, so work on each distinct text once and map back
+    codes, uniques = pd.factorize(dates)
+    texts = pd.Series(uniques, dtype=object)
+
     # Remove the 'hs.' part if it exists
-    date_str = re.sub(r'\s*hs\.\s*$', '', date_str)
-    
-    # Replace the Portuguese month names with English month names
-    month_map = {
-        'JANEIRO': 'January', 'FEVEREIRO': 'February', 'MARÇO': 'March', 'ABRIL': 'April',
-        'MAIO': 'May', 'JUNHO': 'June', 'JULHO': 'July', 'AGOSTO': 'August',
-        'SETEMBRO': 'September', 'OUTUBRO': 'October', 'NOVEMBRO': 'November', 'DEZEMBRO': 'December'
-    }
-    
-    for pt_month, en_month in month_map.items():
-        date_str = date_str.replace(pt_month, en_month)
-    
-    # Parse the date
-    return pd.to_datetime(date_str, format='%d DE %B DE %Y %H:%M HS.')
+    texts = texts.str.replace(r'\s*hs\.\s*$', '', regex=True)
+
+    # Replace the Portuguese month names with English month names in a single pass over the texts
+    texts = texts.str.replace(ml_month_pattern, lambda match: ml_month_map[match.group(0)], regex=True)
+
+    # Parse the dates in one call with the fixed format
+    parsed = pd.to_datetime(texts, format='%d DE %B DE %Y %H:%M HS.')
+    return pd.Series(parsed.reindex(codes).to_numpy(), index=dates.index)
 
 def compute_ML_ANOMES(all_data):
     for key, df in all_data.items():
         # Add the ANOMES column to MLA_Vendas and MLK_Vendas
         if key in ['MLA_Vendas', 'MLK_Vendas'] and 'DATA DA VENDA' in df.columns:
             # Use custom date parser to parse the date string
-            df['DATA DA VENDA'] = df['DATA DA VENDA'].apply(lambda x: mlcustom_date_parser(x) if pd.notnull(x) else pd.NaT)
-            df['ANOMES'] = df['DATA DA VENDA'].dt.strftime('%y%m')  # Format date as YYMM
+            df['DATA DA VENDA'] = mlcustom_date_parser(df['DATA DA VENDA'])
+            df['ANOMES'] = anomes_from_dates(df['DATA DA VENDA'])  # Format date as YYMM
             print(f"Added ANOMES column to {key}")
         all_data[key] = df
     return all_data
@@ -535,48 +546,83 @@ def print_table_and_columns(all_data, table_name):
     else:
         print(f"Table '{table_name}' not found in the dataset.")
 
-def excel_format(output_path, column_format_dict):
-    print("Formatting all sheets")
-    header_style = NamedStyle(name="header_style")
-    header_style.font = Font(bold=True)
-    header_style.fill = PatternFill("solid", fgColor="6ac5fe")  # Light blue background color
-    header_style.alignment = Alignment(horizontal="center", vertical="center")
+def write_formatted_workbook(output_path, all_data, column_format_dict):
+    # Streams every table into a write-only workbook, styling the header and number formats
+    # as the rows go out instead of building the whole cell model in memory first
+    print("Writing and formatting all sheets")
+    header_font = Font(bold=True)
+    header_fill = PatternFill("solid", fgColor="6ac5fe")  # Light blue background color
+    header_alignment = Alignment(horizontal="center", vertical="center")
+
+    workbook = Workbook(write_only=True)
+    for sheet_name, df in all_data.items():
+        worksheet = workbook.create_sheet(title=sheet_name)
 
-    workbook = load_workbook(output_path)
-    for sheet_name in workbook.sheetnames:
-        worksheet = workbook[sheet_name]
-        
         # Apply header style
-        for col_idx in range(1, worksheet.max_column + 1):
-            cell = worksheet.cell(row=1, column=col_idx)
-            cell.style = header_style
-
-        if sheet_name in column_format_dict:
-            formats = column_format_dict[sheet_name]
-            for col_name, col_format in formats.items():
-                # Find the column index based on header name
-                for col_idx, cell in enumerate(worksheet[1], start=1):
-                    if cell.value == col_name:
-                        break
-                else:
-                    continue  # Skip if column name is not found
-
-                # Apply the format to the entire column
-                for row_idx in range(2, worksheet.max_row + 1):  # Start from the second row to avoid header
-                    cell = worksheet.cell(row=row_idx, column=col_idx)
-                    cell.number_format = col_format
+        header = []
+        for col_name in df.columns:
+            cell = WriteOnlyCell(worksheet, value=col_name)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = header_alignment
+            header.append(cell)
+        worksheet.append(header)
+
+        # Number format per column position: pandas' datetime format for date columns, then the
+        # sheet's configured formats (first column with the header name wins)
+        header_map = {}
+        for col_idx, col_name in enumerate(df.columns):
+            header_map.setdefault(col_name, col_idx)
+        col_formats = {col_idx: 'YYYY-MM-DD HH:MM:SS' for col_idx, dtype in enumerate(df.dtypes)
+                       if pd.api.types.is_datetime64_any_dtype(dtype)}
+        configured_cols = set()
+        for col_name, col_format in column_format_dict.get(sheet_name, {}).items():
+            if col_name in header_map:
+                col_formats[header_map[col_name]] = col_format
+                configured_cols.add(header_map[col_name])
+
+        # One styled cell per formatted column, reused on every row: a write-only row is serialized as soon as
+        # it is appended, so only the value changes and the number format is set once per column
+        # (kept as (position, cell, blank cell, format) tuples so the row loop does no dict lookups).
+        # Blank cells of a configured column still get its number format, as when the whole column was formatted
+        format_cells = []
+        for col_idx, col_format in col_formats.items():
+            cell = WriteOnlyCell(worksheet)
+            cell.number_format = col_format
+            blank_cell = None
+            if col_idx in configured_cols:
+                blank_cell = WriteOnlyCell(worksheet)
+                blank_cell.number_format = col_format
+            format_cells.append((col_idx, cell, blank_cell, col_format))
+
+        # Blank out NaN/NaT once for the whole table rather than per cell
+        values = df.astype(object).where(df.notna(), None)
+        # +/-inf (e.g. a margin over a zero value) is written as 'inf'/'-inf' text, as to_excel's inf_rep did
+        for col_idx, dtype in enumerate(df.dtypes):
+            if pd.api.types.is_float_dtype(dtype):
+                column = df.iloc[:, col_idx].to_numpy()
+                is_inf = np.isinf(column)
+                if is_inf.any():
+                    values.iloc[is_inf, col_idx] = np.where(column[is_inf] > 0, 'inf', '-inf')
+        for row in values.itertuples(index=False, name=None):
+            row = list(row)
+            for col_idx, cell, blank_cell, col_format in format_cells:
+                value = row[col_idx]
+                if value is not None:
+                    cell.value = value
+                    if cell.number_format != col_format:
+                        cell.number_format = col_format  # a date/time value may have reset it
+                    row[col_idx] = cell
+                elif blank_cell is not None:
+                    row[col_idx] = blank_cell
+            worksheet.append(row)
+
+        # Add auto-filter over the written range
+        worksheet.auto_filter.ref = f"A1:{get_column_letter(max(len(df.columns), 1))}{len(df) + 1}"
+        print(f"Added {sheet_name} data to {output_path} in sheet {sheet_name}")  # Debug print
 
     workbook.save(output_path)
-    print(f"All sheets formatted")
-
-def excel_autofilters(output_path):
-    print("Adding auto-filters to all sheets")
-    workbook = load_workbook(output_path)
-    for sheetname in workbook.sheetnames:
-        worksheet = workbook[sheetname]
-        worksheet.auto_filter.ref = worksheet.dimensions
-    workbook.save(output_path)
-    print("Added auto-filters to all sheets")
+    print(f"All sheets formatted and auto-filters added")
 
 # Define the audit function
 def perform_audit(df, client_name):
@@ -590,13 +636,16 @@ def perform_audit(df, client_name):
         'TOTALNF',
         'EMISS']
 
-    audit_df = df[df['NOMEF'] == client_name][audit_columns]  
+    audit_df = df.loc[df['NOMEF'] == client_name, audit_columns]
     return audit_df
 
 # Define the function to perform audits for all specified clients
 def perform_all_audits(all_data):
+    # Narrow O_NFCI to the audited clients once instead of scanning the full table per client
+    o_nfci_df = all_data['O_NFCI']
+    o_nfci_df = o_nfci_df.loc[o_nfci_df['NOMEF'].isin(audit_client_names)]
     for client_name in audit_client_names:
-        audit_df = perform_audit(all_data['O_NFCI'], client_name)
+        audit_df = perform_audit(o_nfci_df, client_name)
         all_data[f'Audit_{client_name}'] = audit_df
         print(f"Performed audit for {client_name}")  # Debug print
     return all_data
@@ -604,102 +653,120 @@ def perform_all_audits(all_data):
 # Function to track inventory movements
 # Function to calculate realized cost
 def track_inventory(sales_data, purchase_data):
-    inventory_movements = []
-
+    # Build the movements column-wise instead of boxing every row with iterrows
     # Process sales data
-    for index, row in sales_data.iterrows():
-        movement = {
-            'Date': row['DATA'],
-            'Invoice Number': None,
-            'Product Code': row['CODPF'],
-            'Quantity': -row['QTD'],
-            'CV': 'V',
-            'QTD E': row['QTD'],
-            'CMV Unit E': None,
-            'CMV Mov E': None,
-            'QTD R': None,
-            'CMV Unit R': None,
-            'CMV Mov R': None,
-            'NF Compra': None
-        }
-        inventory_movements.append(movement)
+    sales_movements = pd.DataFrame({
+        'Date': sales_data['DATA'].to_numpy(),
+        'Invoice Number': np.nan,
+        'Product Code': sales_data['CODPF'].to_numpy(),
+        'Quantity': -sales_data['QTD'].to_numpy(),
+        'CV': 'V',
+        'QTD E': sales_data['QTD'].to_numpy(),
+        'CMV Unit E': np.nan,
+        'CMV Mov E': np.nan,
+        'QTD R': np.nan,
+        'CMV Unit R': np.nan,
+        'CMV Mov R': np.nan,
+        'NF Compra': np.nan
+    })
 
     # Process purchase data
-    for index, row in purchase_data.iterrows():
-        movement = {
-            'Date': row['EMISS'],
-            'Invoice Number': row['NF'],
-            'Product Code': row['CODPF'],
-            'Quantity': row['QTD'],
-            'CV': 'C',
-            'QTD E': None,
-            'CMV Unit E': row['PRECO CALC'],
-            'CMV Mov E': row['MERCVLR'],
-            'QTD R': None,
-            'CMV Unit R': None,
-            'CMV Mov R': None,
-            'NF Compra': row['NF'],
-            'Custo Total Unit': row['TOTALNF'] / row['QTD']
-        }
-        inventory_movements.append(movement)
-
-    inventory_df = pd.DataFrame(inventory_movements)
-    inventory_df.sort_values(by='Date', inplace=True)
+    purchase_movements = pd.DataFrame({
+        'Date': purchase_data['EMISS'].to_numpy(),
+        'Invoice Number': purchase_data['NF'].to_numpy(),
+        'Product Code': purchase_data['CODPF'].to_numpy(),
+        'Quantity': purchase_data['QTD'].to_numpy(),
+        'CV': 'C',
+        'QTD E': np.nan,
+        'CMV Unit E': purchase_data['PRECO CALC'].to_numpy(),
+        'CMV Mov E': purchase_data['MERCVLR'].to_numpy(),
+        'QTD R': np.nan,
+        'CMV Unit R': np.nan,
+        'CMV Mov R': np.nan,
+        'NF Compra': purchase_data['NF'].to_numpy(),
+        'Custo Total Unit': (purchase_data['TOTALNF'] / purchase_data['QTD']).to_numpy()
+    })
+
+    inventory_df = pd.concat([sales_movements, purchase_movements], ignore_index=True, sort=False)
+    # Stable sort so movements on the same date keep their order (purchases are consumed in this order)
+    inventory_df.sort_values(by='Date', kind='mergesort', inplace=True)
     return inventory_df
 
 def calculate_realized_cost(inventory_df):
-    # Get all purchases (C) in ascending date order
-    purchase_data = inventory_df[inventory_df['CV'] == 'C'].sort_values(by='Date')
+    # Get all purchases (C) in ascending date order (track_inventory already sorted by date)
+    purchase_data = inventory_df[inventory_df['CV'] == 'C']
 
     # Create a list of purchases as objects with necessary details
-    purchase_list = []
-    for _, row in purchase_data.iterrows():
-        purchase_list.append({
-            'Product Code': row['Product Code'],
-            'Invoice Number': row['Invoice Number'],
-            'Quantity': row['Quantity'],
-            'Custo Total Unit': row['Custo Total Unit']
-        })
-    print("Purchase List:", purchase_list)  # Debug print
+    purchase_list = purchase_data[['Product Code', 'Invoice Number', 'Quantity', 'Custo Total Unit']].to_dict('records')
+    #print("Purchase List:", purchase_list)  # Debug print
+
+    # Index the purchases by product so each sale only walks its own product's purchases
+    purchases_by_product = {}
+    for purchase in purchase_list:
+        purchases_by_product.setdefault(purchase['Product Code'], []).append(purchase)
+
+    # Cell updates are collected in plain dicts (later writes win, as with .at) and each column is
+    # written once at the end instead of going through pandas label indexing for every value
+    updates = {col: {} for col in ['QTD E', 'CMV Unit E', 'CMV Mov E', 'QTD R', 'CMV Unit R', 'CMV Mov R', 'NF Compra']}
+
+    # Position of each product's first purchase that may still have quantity left: purchases are used up
+    # strictly in order, so a sale resumes there instead of rescanning the exhausted ones from the start
+    next_purchase = {}
 
     # Iterate through the sales (V) and populate the realized cost details
-    for index, row in inventory_df[inventory_df['CV'] == 'V'].iterrows():
-        quantity_needed = -row['Quantity']
-        for purchase in purchase_list:
-            if purchase['Product Code'] == row['Product Code'] and quantity_needed > 0:
-                if purchase['Quantity'] > 0:
-                    quantity_to_apply = min(purchase['Quantity'], quantity_needed)
-
-                    # Update the realized cost details
-                    inventory_df.at[index, 'QTD R'] = quantity_to_apply
-                    inventory_df.at[index, 'CMV Unit R'] = purchase['Custo Total Unit']
-                    inventory_df.at[index, 'CMV Mov R'] = quantity_to_apply * purchase['Custo Total Unit']
-                    inventory_df.at[index, 'NF Compra'] = purchase['Invoice Number']
-
-                    # Update the purchase details
-                    purchase['Quantity'] -= quantity_to_apply
-                    quantity_needed -= quantity_to_apply
+    # (only the three columns read here are walked, as plain tuples instead of boxed rows)
+    sales = inventory_df.loc[inventory_df['CV'] == 'V', ['Product Code', 'Quantity', 'CMV Unit E']]
+    for index, product_code, quantity, cmv_unit_e in sales.itertuples(name=None):
+        quantity_needed = -quantity
+        purchases = purchases_by_product.get(product_code, [])
+        position = next_purchase.get(product_code, 0)
+        while position < len(purchases):
+            if not quantity_needed > 0:
+                break
+            purchase = purchases[position]
+            if purchase['Quantity'] > 0:
+                quantity_to_apply = min(purchase['Quantity'], quantity_needed)
+
+                # Update the realized cost details
+                updates['QTD R'][index] = quantity_to_apply
+                updates['CMV Unit R'][index] = purchase['Custo Total Unit']
+                updates['CMV Mov R'][index] = quantity_to_apply * purchase['Custo Total Unit']
+                updates['NF Compra'][index] = purchase['Invoice Number']
+
+                # Update the purchase details
+                purchase['Quantity'] -= quantity_to_apply
+                quantity_needed -= quantity_to_apply
+            if not purchase['Quantity'] > 0:
+                position += 1
+        next_purchase[product_code] = position
 
         # If there's still quantity needed, populate the expected cost details
         if quantity_needed > 0:
-            inventory_df.at[index, 'QTD E'] = quantity_needed
-            if row['CMV Unit E'] is not None:
-                inventory_df.at[index, 'CMV Mov E'] = quantity_needed * row['CMV Unit E']
+            updates['QTD E'][index] = quantity_needed
+            if cmv_unit_e is not None:
+                updates['CMV Mov E'][index] = quantity_needed * cmv_unit_e
+
+    # First row of each (product, invoice) purchase, so leftovers go straight to their row instead of rescanning the table
+    # (missing keys are masked out for the whole column at once instead of testing each value with pd.notna)
+    purchase_keys = purchase_data.loc[purchase_data['Product Code'].notna() & purchase_data['Invoice Number'].notna(),
+                                      ['Product Code', 'Invoice Number']].drop_duplicates()
+    purchase_rows = dict(zip(zip(purchase_keys['Product Code'], purchase_keys['Invoice Number']), purchase_keys.index))
 
     # Add remaining purchase quantities back to the corresponding purchase rows
     for purchase in purchase_list:
         if purchase['Quantity'] > 0:
-            purchase_indices = inventory_df[
-                (inventory_df['Product Code'] == purchase['Product Code']) &
-                (inventory_df['Invoice Number'] == purchase['Invoice Number'])
-            ].index
-            if not purchase_indices.empty:
-                purchase_index = purchase_indices[0]
-                inventory_df.at[purchase_index, 'QTD E'] = purchase['Quantity']
-                inventory_df.at[purchase_index, 'CMV Unit E'] = purchase['Custo Total Unit']
-                inventory_df.at[purchase_index, 'CMV Mov E'] = purchase['Quantity'] * purchase['Custo Total Unit']
-
-    print(inventory_df)  # Debug print
+            purchase_index = purchase_rows.get((purchase['Product Code'], purchase['Invoice Number']))
+            if purchase_index is not None:
+                updates['QTD E'][purchase_index] = purchase['Quantity']
+                updates['CMV Unit E'][purchase_index] = purchase['Custo Total Unit']
+                updates['CMV Mov E'][purchase_index] = purchase['Quantity'] * purchase['Custo Total Unit']
+
+    # Write each updated column back in one assignment
+    for col, values in updates.items():
+        if values:
+            inventory_df.loc[list(values), col] = list(values.values())
+
+    #print(inventory_df)  # Debug print
     return inventory_df
 
 
@@ -715,8 +782,11 @@ def perform_invaudit(o_nfci_df, l_lpi_df, client_name):
 
 # Function to perform all inventory audits
 def perform_all_invaudits(all_data):
+    # Narrow both tables to the audited clients once instead of scanning them in full per client
     o_nfci_df = all_data['O_NFCI']
+    o_nfci_df = o_nfci_df.loc[o_nfci_df['NOMEF'].isin(invaudit_client_names)]
     l_lpi_df = all_data['L_LPI']
+    l_lpi_df = l_lpi_df.loc[l_lpi_df['EMPRESAF'].isin(invaudit_client_names)]
 
     invaudit_results = {}
     for client in invaudit_client_names:
@@ -759,13 +829,18 @@ def main():
                      'T_RegrasMP.xlsx', 'T_Remessas.xlsx', 'T_Reps.xlsx', 'T_Verbas.xlsx','T_Vol.xlsx', 'T_ProdF.xlsx', 
                      'T_ProdP.xlsx', 'T_Entradas.xlsx', 'T_FretesMP.xlsx', 'T_MLStatus.xlsx', 'T_CtasAPagarClass.xlsx',
                      'T_CtasARecClass.xlsx', 'T_CCCats.xlsx']
-    static_data_dict = {table.replace('.xlsx', ''): load_static_data(static_dir, table) for table in static_tables}
+    # The tables and the inventory file are independent reads, so start them all at once
+    # (they sit on a synced folder and mostly wait on I/O); results are collected in table order
+    with ThreadPoolExecutor() as executor:
+        static_futures = {table.replace('.xlsx', ''): executor.submit(load_static_data, static_dir, table) for table in static_tables}
+        inventory_future = executor.submit(preprocess_inventory_data, inventory_file_path)
+    static_data_dict = {key: future.result() for key, future in static_futures.items()}
     
     # Check static data shapes
     for key, df in static_data_dict.items():
         print(f"Static data {key} shape: {df.shape}")  # Debug print
     
-    inventory_data = preprocess_inventory_data(inventory_file_path)
+    inventory_data = inventory_future.result()
  
     # Add static data to all_data dictionary
     all_data.update(static_data_dict) 
@@ -786,15 +861,9 @@ def main():
 
     # Save all data to one Excel file with multiple sheets
     output_path = os.path.join(base_dir, 'clean', 'merged_data.xlsx')
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        for key, df in all_data.items():
-            df.to_excel(writer, sheet_name=key, index=False)
-            print(f"Added {key} data to {output_path} in sheet {key}")  # Debug print
+    write_formatted_workbook(output_path, all_data, column_format_dict)
 
     print(f"All merged data saved to {output_path}")
 
-    excel_format(output_path, column_format_dict)
-    excel_autofilters(output_path)
-
 if __name__ == "__main__":
     main()
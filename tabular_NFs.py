@@ -18,13 +18,17 @@ def parse_xml(xml_file):
     }
 
 def process_directory(base_path, current_month=True):
+    # Month folder name (e.g. "03-March") worked out once for the whole run
+    this_month = datetime.now().strftime("%m-%B")
     series_dirs = [d for d in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, d))]
     for series in series_dirs:
         series_path = os.path.join(base_path, series)
-        month_dirs = [d for d in os.listdir(series_path) if os.path.isdir(os.path.join(series_path, d))]
+        if current_month:
+            # Only the current month is needed, so probe that folder instead of listing every month
+            month_dirs = [this_month] if os.path.isdir(os.path.join(series_path, this_month)) else []
+        else:
+            month_dirs = [d for d in os.listdir(series_path) if os.path.isdir(os.path.join(series_path, d))]
         for month in month_dirs:
-            if current_month and month != datetime.now().strftime("%m-%B"):
-                continue
             month_path = os.path.join(series_path, month)
             xml_files = [f for f in os.listdir(month_path) if f.endswith('.xml')]
             all_data = []
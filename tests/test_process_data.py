@@ -0,0 +1,33 @@
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+import process_data
+
+
+def test_save_cleaned_data_writes_nan_and_inf_cells(tmp_path):
+    data = pd.DataFrame({
+        'a': [1.0, np.nan, np.inf, -np.inf],
+        'b': ['x', None, 'y', 'z'],
+        'c': pd.to_datetime(['2024-01-01', None, '2024-02-02', '2024-03-03']),
+    })
+    output_filepath = tmp_path / 'clean' / 'X_2024_11_clean.xlsx'
+
+    process_data.save_cleaned_data(data, str(output_filepath))
+
+    rows = list(openpyxl.load_workbook(output_filepath).active.iter_rows(values_only=True))
+    assert rows[0] == ('a', 'b', 'c')
+    assert [row[0] for row in rows[1:]] == [1, None, 'inf', '-inf']
+    assert rows[2] == (None, None, None)
+    assert list(output_filepath.parent.iterdir()) == [output_filepath]
+
+
+def test_save_cleaned_data_leaves_no_file_when_a_write_fails(tmp_path):
+    data = pd.DataFrame({'a': [1.0, object()]})
+    output_filepath = tmp_path / 'X_2024_11_clean.xlsx'
+
+    with pytest.raises(TypeError):
+        process_data.save_cleaned_data(data, str(output_filepath))
+
+    assert list(tmp_path.iterdir()) == []